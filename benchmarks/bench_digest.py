@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+"""
+Compare throughput and peak RSS of `Digest` backends against the
+`f.read(0x1000000)` loop they replaced.
+
+Usage: bench_digest.py [SIZE_IN_MB] [PATH]
+
+Each backend runs in a fresh process, so that peak RSS (Unix only) is
+measured independently. The file is created if it does not exist; run
+it twice or drop the page cache to compare cold reads.
+"""
+
+from sys import version_info
+
+assert version_info >= (3, 10)
+
+import hashlib
+import mmap
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'scripts'))
+
+from utils import Digest  # noqa: E402
+
+_digest = sys.modules['utils.digest']
+
+
+def _read(path: str) -> str:
+    hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(0x1000000)  # 16 MB
+            if not data:
+                break
+            hash.update(data)
+    return hash.hexdigest()
+
+
+def _readinto(path: str) -> str:
+    hash = hashlib.sha256()
+    buffer = _digest._buffer()
+    with open(path, 'rb', buffering=0) as f:
+        while n := f.readinto(buffer):
+            hash.update(buffer[:n])
+    return hash.hexdigest()
+
+
+def _mmap(path: str) -> str:
+    hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            hash.update(m)
+    return hash.hexdigest()
+
+
+def _auto(path: str) -> str:
+    return Digest(path).hexdigest()
+
+
+_BACKENDS = {
+    'read': _read,
+    'readinto': _readinto,
+    'mmap': _mmap,
+    'Digest': _auto
+}
+
+
+def _run(backend: str, path: str) -> None:
+    start = perf_counter()
+    result = _BACKENDS[backend](path)
+    elapsed = perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB on Linux
+    print(result, elapsed, peak)
+
+
+def main(size_mb: int = 2048, path: str | None = None) -> None:
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), 'bench_digest.bin')
+    size = size_mb * 0x100000
+    if not os.path.exists(path) or os.path.getsize(path) != size:
+        with open(path, 'wb') as f:
+            chunk = os.urandom(0x100000)
+            for _ in range(size_mb):
+                f.write(chunk)
+
+    print(f'{size_mb} MB, sha256:')
+    expected = None
+    for backend in _BACKENDS:
+        output = subprocess.run(
+            [sys.executable, __file__, '--run', backend, path],
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.split()
+        result, elapsed, peak = output[0], float(output[1]), int(output[2])
+        if expected is None:
+            expected = result
+        assert result == expected, f'{backend}: results differ'
+        print(
+            f'{backend + ":":<12}'
+            f'{size_mb / elapsed:>10.1f} MB/s'
+            f'{peak / 1024:>10.1f} MB peak RSS'
+        )
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--run']:
+        _run(sys.argv[2], sys.argv[3])
+    else:
+        main(*(int(i) if n == 0 else i for n, i in enumerate(sys.argv[1:])))
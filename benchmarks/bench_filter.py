@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+"""
+Compare `utils.filter` against the `Path.rglob` based walker it replaced.
+
+Usage: bench_filter.py [ENTRIES] [PATH]
+
+A tree of ENTRIES files (1000 per directory, 10 directories per level)
+is created under PATH if it does not exist yet.
+"""
+
+from sys import version_info
+
+assert version_info >= (3, 10)
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+from typing import Generator, Iterable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'scripts'))
+
+from utils import filter  # noqa: E402
+
+_SUFFIXES = ('.txt', '.md', '.tar.gz', '.py', '')
+
+
+def _rglob(
+    path: Path,
+    include: Iterable[str] | None = None,
+    exclude: Iterable[str] | None = None
+) -> Generator[Path, None, None]:
+    """
+    Reference implementation.
+    """
+    if include is not None:
+        include = set(f'.{i.lstrip(".")}' for i in include)
+    if exclude is not None:
+        exclude = set(f".{i.lstrip('.')}" for i in exclude)
+    for i in path.rglob('*'):
+        if not i.is_file():
+            continue
+        suffix = i.suffix
+        suffixes = ''.join(i.suffixes)
+        if exclude is not None:
+            if suffix in exclude or suffixes in exclude:
+                continue
+        if include is not None:
+            if suffix not in include and suffixes not in include:
+                continue
+        yield i
+
+
+def _build(path: Path, entries: int) -> None:
+    directories = [path]
+    count = 0
+    while count < entries:
+        parent = directories.pop(0)
+        for i in range(10):
+            directory = parent / f'd{i}'
+            directory.mkdir(parents=True, exist_ok=True)
+            directories.append(directory)
+        for i in range(min(1000, entries - count)):
+            (parent / f'f{i}{_SUFFIXES[i % len(_SUFFIXES)]}').touch()
+        count += 1000
+
+
+def main(entries: int = 1000000, path: str | None = None) -> None:
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), f'bench_filter_{entries}')
+    root = Path(path)
+    if not root.exists():
+        print(f'Building {entries} entries under {root} ...')
+        _build(root, entries)
+
+    for include in (None, ['txt', 'tar.gz']):
+        print(f'include={include}:')
+        results = {}
+        for name, func in (
+            ('rglob', lambda: list(_rglob(root, include))),
+            ('scandir', lambda: list(filter(root, include, recursive=True)))
+        ):
+            start = perf_counter()
+            results[name] = func()
+            print(f'{name + ":":<12}{perf_counter() - start:>8.3f} s')
+        assert results['rglob'] == results['scandir'], 'results differ'
+        print(f'{len(results["scandir"])} files')
+
+
+if __name__ == '__main__':
+    main(*(int(i) if n == 0 else i for n, i in enumerate(sys.argv[1:])))
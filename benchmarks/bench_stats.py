@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+Compare the bulk classifier of `stats._tally` against the per-match
+regex dispatch it replaced, on mixed CJK and Latin text.
+"""
+
+from sys import version_info
+
+assert version_info >= (3, 10)
+
+import random
+import sys
+from pathlib import Path
+from timeit import repeat
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'scripts'))
+
+import stats  # noqa: E402
+
+_PIECES = [
+    '天地玄黄，宇宙洪荒。日月盈昃，辰宿列张。',
+    'いろはにほへと、ちりぬるを。',
+    'カタカナのテキスト。',
+    'The quick brown fox jumps over the lazy dog. ',
+    'foo_bar = 42; ',
+    '\n',
+    '\n\n',
+    '  \n \n',
+    '\t'
+]
+
+
+def _tally_regex(stats_: stats._Stats, text: str) -> str | None:
+    """
+    Reference implementation: one Python branch per `_PATTERN` match.
+    """
+    _last: str | None = None
+    for _match in stats._PATTERN.finditer(text):
+        j, k, l, m, n, o, _last, p, q = _match.groups('')
+        if j:
+            stats_['cjk'] += 1
+            stats_['words'] += 1
+        elif k:
+            stats_['hiragana'] += 1
+            stats_['words'] += 1
+        elif l:
+            stats_['katakana'] += 1
+            stats_['words'] += 1
+        elif m:
+            stats_['words'] += 1
+        elif n:
+            stats_['punctuations'] += 1
+        elif o:
+            _linefeeds: int = o.count('\n')
+            if _linefeeds > 1:
+                stats_['paragraphs'] += 1
+            stats_['non_blank_lines'] += 1
+            stats_['lines'] += _linefeeds
+        elif p:
+            stats_['whitespaces'] += 1
+        elif q:
+            stats_['others'] += 1
+    return _last
+
+
+def main(size: int = 0x100000, number: int = 3) -> None:
+    random.seed(0)
+    text = ''
+    while len(text) < size:
+        text += random.choice(_PIECES)
+
+    expected, actual = stats._Stats(), stats._Stats()
+    _tally_regex(expected, text)
+    stats._tally(actual, text)
+    assert +expected == +actual, 'results differ'
+
+    print(f'{len(text)} characters, best of {number}:')
+    results = {}
+    for name, func in (('regex', _tally_regex), ('bulk', stats._tally)):
+        results[name] = min(
+            repeat(lambda: func(stats._Stats(), text), number=1, repeat=number)
+        )
+        print(f'{name + ":":<28}{results[name]:>8.3f} s')
+    print(f'{"Speedup:":<28}{results["regex"] / results["bulk"]:>8.1f} x')
+
+
+if __name__ == '__main__':
+    main()
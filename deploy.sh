@@ -2,8 +2,13 @@
 
 # this script must be executed top level directory of 'inkutils'
 
-python ./services/deploy.py
+python ./services/deploy.py "$@"
+status=$?
 
-# exit prompt
-echo
-read -p 'Press any key to exit...' -n 1
+# exit prompt, unless run unattended with options
+if [ $# -eq 0 ]; then
+    echo
+    read -p 'Press any key to exit...' -n 1
+fi
+
+exit $status
@@ -5,10 +5,426 @@ from sys import version_info
 assert version_info >= (3, 10)
 
 import argparse
+import errno
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterable, Literal, Sequence
+from typing import (
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    Sequence,
+    TextIO,
+    get_args
+)
 
-from utils import filter, hexdigest, pavlov
+from utils import (
+    Algorithm,
+    DigestCache,
+    duplicates,
+    filter,
+    hexdigest,
+    pavlov
+)
+
+
+def _hexdigests(
+    paths: Iterable[Path],
+    algorithm: Algorithm = 'sha256',
+    jobs: int = 1,
+    cache: DigestCache | None = None,
+    known: dict[Path, str] | None = None
+) -> Iterator[tuple[Path, str]]:
+    """
+    Yield `(path, hexdigest(path, algorithm, cache))` in the order of
+    `paths`, taking digests in `known` as is.
+
+    If `jobs` is not 1, files are hashed by a thread pool (`hashlib`
+    releases the GIL while hashing large buffers). At most `jobs * 4`
+    files are in flight.
+    """
+    if known is None:
+        known = {}
+
+    if jobs == 1:
+        for i in paths:
+            if i in known:
+                yield i, known[i]
+            else:
+                yield i, hexdigest(i, algorithm, cache)
+        return None
+
+    jobs = jobs or min(32, (os.cpu_count() or 1) + 4)
+    window = jobs * 4
+    with ThreadPoolExecutor(jobs) as executor:
+        pending: deque[tuple[Path, Future[str]]] = deque()
+        for i in paths:
+            if i in known:
+                future: Future[str] = Future()
+                future.set_result(known[i])
+            else:
+                future = executor.submit(hexdigest, i, algorithm, cache)
+            pending.append((i, future))
+            if len(pending) >= window:
+                path, future = pending.popleft()
+                yield path, future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield path, future.result()
+
+    return None
+
+
+class _Journal:
+    """
+    Write-ahead journal of a rename run, kept in working directory.
+
+    Planned `(source, digest, target)` entries are flushed to disk (and
+    fsynced) in batches before any of them is carried out, and completed
+    entries are recorded lazily, so a crash loses at most the record of
+    renames whose result is still visible on disk: an entry whose source
+    is gone while its target exists is considered completed.
+
+    Each line is a JSON array: `["plan", source, digest, target]`,
+    `["done", source]` or `["end"]`; a torn last line is ignored. Paths
+    are relative to the directory of the journal, so that a run can be
+    resumed or rolled back from any working directory.
+    """
+
+    name = '.hash_rename.journal'
+    batch = 256
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.path = root / self.name
+        self.planned: dict[str, tuple[str, str]] = {}
+        self.done: set[str] = set()
+        self.ended = True
+        if self.path.exists():
+            self._load()
+        self.__file: TextIO | None = None
+
+    def _load(self) -> None:
+        self.ended = False
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                match record:
+                    case ['plan', source, digest, target]:
+                        self.planned[source] = (digest, target)
+                    case ['done', source]:
+                        self.done.add(source)
+                    case ['end']:
+                        self.ended = True
+
+    def _relative(self, path: Path) -> str:
+        return os.path.relpath(path, self.root)
+
+    def _resolve(self, path: str) -> Path:
+        return Path(os.path.normpath(self.root / path))
+
+    def entries(self) -> dict[Path, tuple[str, Path]]:
+        """
+        Return planned entries as `{source: (digest, target)}`, in order.
+        """
+        return {
+            self._resolve(source): (digest, self._resolve(target))
+            for source, (digest, target) in self.planned.items()
+        }
+
+    def completed(self) -> list[tuple[Path, Path]]:
+        """
+        Return `(source, target)` of completed entries, in order.
+        """
+        completed = []
+        for source, (_, target) in self.planned.items():
+            source_, target_ = self._resolve(source), self._resolve(target)
+            if source in self.done or (
+                not os.path.lexists(source_) and os.path.exists(target_)
+            ):
+                completed.append((source_, target_))
+        return completed
+
+    def open(self) -> None:
+        """
+        Open for writing; an unfinished journal is resumed, otherwise a
+        new one is started.
+        """
+        if self.ended:
+            self.planned.clear()
+            self.done.clear()
+            self.ended = False
+            self.__file = open(self.path, 'w', encoding='utf-8')
+        else:
+            self.__file = open(self.path, 'a', encoding='utf-8')
+
+    def _write(self, record: list[str]) -> None:
+        assert self.__file is not None
+        self.__file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _sync(self) -> None:
+        assert self.__file is not None
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+
+    def plan(self, entries: Iterable[tuple[Path, str, Path]]) -> None:
+        for source, digest, target in entries:
+            source_, target_ = self._relative(source), self._relative(target)
+            self.planned[source_] = (digest, target_)
+            self._write(['plan', source_, digest, target_])
+        self._sync()
+
+    def complete(self, source: Path) -> None:
+        source_ = self._relative(source)
+        if source_ not in self.done:
+            self.done.add(source_)
+            self._write(['done', source_])
+
+    def end(self) -> None:
+        self._write(['end'])
+        self._sync()
+        self.ended = True
+        self.close()
+
+    def close(self) -> None:
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+class _Index:
+    """
+    Index of a content-addressed store, mapping original paths (absolute)
+    to digests and paths in the store, so that files are looked up by
+    digest or by old name without scanning the store.
+    """
+
+    name = '.hash_rename.index.sqlite3'
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.path = root / self.name
+        root.mkdir(parents=True, exist_ok=True)
+        self.__connection = sqlite3.connect(self.path)
+        self.__connection.execute(
+            'CREATE TABLE IF NOT EXISTS objects ('
+            'source TEXT PRIMARY KEY, '
+            'digest TEXT, '
+            'target TEXT'
+            ') WITHOUT ROWID'
+        )
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS objects_digest ON objects (digest)'
+        )
+
+    def __enter__(self) -> '_Index':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def put(self, source: Path, digest: str, target: Path) -> None:
+        self.__connection.execute(
+            'INSERT OR REPLACE INTO objects VALUES (?, ?, ?)',
+            (
+                os.path.abspath(source),
+                digest.lower(),
+                os.path.relpath(target, self.root)
+            )
+        )
+
+    def by_digest(self, digest: str) -> list[tuple[Path, Path]]:
+        """
+        Return `(source, target)` of files with `digest`.
+        """
+        return [
+            (Path(source), self.root / target)
+            for source, target in self.__connection.execute(
+                'SELECT source, target FROM objects WHERE digest = ?',
+                (digest.lower(),)
+            )
+        ]
+
+    def by_source(self, source: Path | str) -> tuple[str, Path] | None:
+        """
+        Return `(digest, target)` of the file formerly at `source`.
+        """
+        row = self.__connection.execute(
+            'SELECT digest, target FROM objects WHERE source = ?',
+            (os.path.abspath(source),)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], self.root / row[1]
+
+    def commit(self) -> None:
+        self.__connection.commit()
+
+    def close(self) -> None:
+        self.__connection.commit()
+        self.__connection.close()
+
+
+def _root(path: Path) -> Path:
+    return path.parent if path.is_file() else path
+
+
+def _move(source: Path, target: Path) -> Path:
+    """
+    Rename `source` to `target`, copying across filesystems (e.g. into a
+    store on another device).
+    """
+    try:
+        return source.rename(target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    return Path(shutil.move(source, target))
+
+
+def _temp(path: Path) -> Path:
+    """
+    Return a name not taken next to `path`, to move or link it through.
+    """
+    while True:
+        temp = path.with_name(f'.{path.name}.{os.urandom(4).hex()}.tmp')
+        if not os.path.lexists(temp):
+            return temp
+
+
+def _order(moves: dict[Path, Path]) -> list[tuple[Path, Path, Path]]:
+    """
+    Order `source -> target` moves so that no target is overwritten
+    while it is still a source to be moved, e.g. 'b -> c' before
+    'a -> b'. A cycle of moves is broken by moving one of its sources
+    to a temporary name first.
+
+    Return `(source, moved_from, moved_to)`, where `moved_to` is not
+    `moves[source]` only for the move to a temporary name.
+    """
+    remaining = dict(moves)
+    ordered: list[tuple[Path, Path, Path]] = []
+    for i in moves:
+        # follow sources whose targets are sources in turn
+        chain: list[Path] = []
+        on_chain: set[Path] = set()
+        while i in remaining and i not in on_chain:
+            chain.append(i)
+            on_chain.add(i)
+            i = remaining[i]
+        aside = None
+        if i in on_chain:  # a cycle back to `i`
+            aside = _temp(i)
+            ordered.append((i, i, aside))
+        for j in reversed(chain):
+            target = remaining.pop(j)
+            ordered.append(
+                (j, aside if j == i and aside is not None else j, target)
+            )
+    return ordered
+
+
+def _check_fanout(fanout: int, algorithm: str) -> None:
+    # one level per pair of hex digits
+    limit = hashlib.new(algorithm).digest_size
+    if not 0 <= fanout <= limit:
+        raise ValueError(
+            f"value '{fanout}' is invalid, expect 0 to {limit} "
+            f"for '{algorithm}'."
+        )
+
+
+def _target(
+    path: Path,
+    hexdigest_: str,
+    prefix: str,
+    drop_suffix: bool,
+    case_: str,
+    flatten: bool,
+    store: Path | None = None,
+    fanout: int = 2
+) -> Path:
+    if store is not None:
+        # e.g. 'ab/cd/abcd...' for `fanout=2`
+        parent = store.joinpath(
+            *(hexdigest_[k * 2:k * 2 + 2].lower() for k in range(fanout))
+        )
+    elif flatten:
+        parent = Path()
+    else:
+        parent = path.parent
+    suffix = '' if drop_suffix else ''.join(path.suffixes)
+    name = prefix + hexdigest_ + suffix
+    match case_.lower():
+        case 'lower':
+            name = name.lower()
+        case 'upper':
+            name = name.upper()
+        case 'keep':
+            pass
+        case _:
+            raise ValueError(
+                f"value '{case_}' is invalid, "
+                "expect 'lower', 'upper' or 'keep'."
+            )
+    return parent / name
+
+
+def _duplicates(
+    paths: list[Path],
+    algorithm: Algorithm,
+    cache: DigestCache | None,
+    target: Callable[[Path, str], Path]
+) -> tuple[dict[Path, Path], dict[Path, str]]:
+    """
+    Return duplicates mapped to their first occurrences, and hex digests
+    computed on the way (not to be computed again).
+
+    Files are duplicates only if they would be renamed to the same
+    target, i.e. of the same content and suffix.
+    """
+    digests: dict[Path, bytes] = {}
+    originals: dict[Path, Path] = {}
+    for group in duplicates(paths, algorithm, cache, digests=digests):
+        by_target: dict[Path, list[Path]] = {}
+        for i in group:
+            by_target.setdefault(target(i, digests[i].hex()), []).append(i)
+        for members in by_target.values():
+            originals.update((i, members[0]) for i in members[1:])
+    return originals, {i: j.hex() for i, j in digests.items()}
+
+
+def _settle(
+    originals: dict[Path, Path],
+    renamed: dict[Path, Path],
+    on_duplicate: str,
+    quiet: bool
+) -> None:
+    """
+    Report duplicates or replace them by hard links to their renamed
+    first occurrences.
+    """
+    for i, original in originals.items():
+        new = renamed.get(original, original)
+        match on_duplicate:
+            case 'report':
+                print(f"'{i}' duplicates '{new}'.", end='\n\n')
+            case 'hardlink':
+                temp = _temp(i)
+                os.link(new, temp)
+                os.replace(temp, i)
+                if not quiet:
+                    print(f"'{i}' => '{new}'.", end='\n\n')
 
 
 def rename(
@@ -19,8 +435,14 @@ def rename(
     drop_suffix: bool = False,
     case_: Literal['lower', 'upper', 'keep'] = 'lower',
     flatten: bool = False,
-    algorithm: Literal['md5', 'sha1', 'sha256', 'sha512'] = 'sha256',
-    quiet: bool = False
+    algorithm: Algorithm = 'sha256',
+    quiet: bool = False,
+    jobs: int = 1,
+    cache: bool = True,
+    on_duplicate: Literal['overwrite', 'report', 'skip', 'hardlink'] = 'overwrite',
+    journal: bool = False,
+    store: Path | str | None = None,
+    fanout: int = 2
 ) -> list[Path]:
     """
     Parameters
@@ -49,6 +471,34 @@ def rename(
         Specify hash algorithm.
     quiet :
         If True, run quietly.
+    jobs :
+        Number of threads hashing files concurrently. If 0, use as many
+        as `concurrent.futures.ThreadPoolExecutor` does by default.
+        Files are renamed in the same order regardless.
+    cache :
+        If True, reuse digests of unchanged files from the digest cache
+        shared by all scripts (see `utils.DigestCache`).
+    on_duplicate :
+        What to do with files whose content duplicates an earlier file.
+        If 'overwrite', rename them anyway, overwriting each other;
+        Otherwise duplicates are detected up front (by size, then by
+        sampled content, and only then by full digest) and are left
+        alone ('skip'), left alone and reported ('report') or replaced
+        by hard links to the renamed file ('hardlink').
+    journal :
+        If True, keep a write-ahead journal ('.hash_rename.journal') in
+        working directory. If a previous run left an unfinished journal,
+        it is resumed: files renamed already are skipped, and files
+        planned but not yet renamed are renamed as planned without being
+        hashed again. The journal is kept after the run for `rollback`.
+    store :
+        If not None, move files into this content-addressed store
+        instead, under `fanout` levels of directories named after pairs
+        of leading hex digits of their digests (e.g. 'ab/cd/abcd...'),
+        and record them in the index of the store (see `lookup`).
+        Overrides `flatten`.
+    fanout :
+        Levels of directories in `store`.
 
     Returns
     -------
@@ -62,32 +512,422 @@ def rename(
     if prefix is None:
         prefix = ''
 
+    if on_duplicate not in ('overwrite', 'report', 'skip', 'hardlink'):
+        raise ValueError(
+            f"value '{on_duplicate}' is invalid, "
+            "expect 'overwrite', 'report', 'skip' or 'hardlink'."
+        )
+
+    if isinstance(store, str):
+        store = Path(store)
+
+    if store is not None:
+        _check_fanout(fanout, algorithm)
+
+    digest_cache = DigestCache.default() if cache else None
+
+    index = None if store is None else _Index(store)
+    journal_ = _Journal(_root(path)) if journal else None
+    finished: dict[Path, Path] = {}  # target -> source, done already
+    planned: dict[Path, tuple[str, Path]] = {}  # source -> (digest, target)
+    if journal_ is not None and not journal_.ended:
+        finished = {j: i for i, j in journal_.completed()}
+        sources = set(finished.values())
+        planned = {
+            i: j for i, j in journal_.entries().items() if i not in sources
+        }
+
+    paths: Iterable[Path] = (
+        i for i in filter(path, include, exclude)
+        if i.name not in (_Journal.name, _Index.name) and i not in finished
+    )
+
+    def target(i: Path, hexdigest_: str) -> Path:
+        if i in planned:
+            return planned[i][1]
+        return _target(
+            i,
+            hexdigest_,
+            prefix,
+            drop_suffix,
+            case_,
+            flatten,
+            store,
+            fanout
+        )
+
+    known = {i: digest_ for i, (digest_, _) in planned.items()}
+    originals: dict[Path, Path] = {}  # duplicate -> first occurrence
+    if on_duplicate != 'overwrite':
+        paths = list(paths)
+        # files renamed by an interrupted run come first, so that they
+        # are kept as originals
+        candidates = [i for i in finished if i.exists()] + paths
+        originals, hexdigests = _duplicates(
+            candidates,
+            algorithm,
+            digest_cache,
+            target
+        )
+        known.update(hexdigests)
+        paths = [i for i in paths if i not in originals]
+
     new_paths: list[Path] = []
+    renamed: dict[Path, Path] = {}
 
-    for i in filter(path, include, exclude):
-        parent = Path() if flatten else i.parent
-        suffix = '' if drop_suffix else ''.join(i.suffixes)
-        name = prefix + hexdigest(i, algorithm) + suffix
-        match case_.lower():
-            case 'lower':
-                name = name.lower()
-            case 'upper':
-                name = name.upper()
-            case 'keep':
-                pass
-            case _:
-                raise ValueError(
-                    f"value '{case_}' is invalid, "
-                    "expect 'lower', 'upper' or 'keep'."
-                )
-        new = i.rename(parent / name)
+    def apply(batch: list[tuple[Path, str, Path]]) -> None:
+        if journal_ is not None:
+            journal_.plan(i for i in batch if i[0] not in planned)
+        for i, hexdigest_, target in batch:
+            if index is not None:
+                target.parent.mkdir(parents=True, exist_ok=True)
+            new = _move(i, target)
+            new_paths.append(new)
+            renamed[i] = new
+            if journal_ is not None:
+                journal_.complete(i)
+            if index is not None:
+                index.put(i, hexdigest_, new)
+            if not quiet:
+                print(f"'{i}' -> '{new}'.", end='\n\n')
+        if index is not None:
+            index.commit()
+        batch.clear()
+
+    if journal_ is not None:
+        journal_.open()
+        for i in finished.values():
+            journal_.complete(i)  # if renamed right before a crash
+
+    batch: list[tuple[Path, str, Path]] = []
+    for i, hexdigest_ in _hexdigests(
+        paths,
+        algorithm,
+        jobs,
+        digest_cache,
+        known
+    ):
+        batch.append((i, hexdigest_, target(i, hexdigest_)))
+        if (
+            (journal_ is None and index is None) or
+            len(batch) >= _Journal.batch
+        ):
+            apply(batch)
+    apply(batch)
+
+    if journal_ is not None:
+        journal_.end()
+    if index is not None:
+        index.close()
+
+    _settle(originals, renamed, on_duplicate, quiet)
+
+    return new_paths
+
+
+def plan(
+    path: Path | str | None = None,
+    include: Iterable[str] | None = None,
+    exclude: Iterable[str] | None = None,
+    prefix: str | None = None,
+    drop_suffix: bool = False,
+    case_: Literal['lower', 'upper', 'keep'] = 'lower',
+    flatten: bool = False,
+    algorithm: Algorithm = 'sha256',
+    jobs: int = 1,
+    cache: bool = True,
+    on_duplicate: Literal['overwrite', 'report', 'skip', 'hardlink'] = 'overwrite',
+    store: Path | str | None = None,
+    fanout: int = 2
+) -> dict:
+    """
+    Hash files and compute what `rename` would do with the same
+    arguments, without touching the filesystem.
+
+    Returns
+    -------
+    dict :
+        JSON-serializable plan to be carried out by `apply_plan`, with
+        paths as str:
+
+        - 'cwd': current working directory, which relative paths are
+          relative to;
+        - 'on_duplicate': as passed;
+        - 'store': as passed, or None;
+        - 'renames': list of `{'source', 'digest', 'target'}`;
+        - 'duplicates': list of `{'source', 'original'}`, where
+          'original' is the first occurrence before renaming;
+        - 'collisions': list of `{'target', 'sources'}` for targets
+          shared by several sources or taken by a file not renamed;
+        - 'cross_device': sources on another device than their targets
+          (with `flatten` or `store`), which can not be renamed in
+          place;
+        - 'no_op': sources already named as their targets.
+    """
+    if path is None:
+        path = Path()
+    elif isinstance(path, str):
+        path = Path(path)
+
+    if prefix is None:
+        prefix = ''
+
+    if on_duplicate not in ('overwrite', 'report', 'skip', 'hardlink'):
+        raise ValueError(
+            f"value '{on_duplicate}' is invalid, "
+            "expect 'overwrite', 'report', 'skip' or 'hardlink'."
+        )
+
+    if isinstance(store, str):
+        store = Path(store)
+
+    if store is not None:
+        _check_fanout(fanout, algorithm)
+
+    digest_cache = DigestCache.default() if cache else None
+
+    paths: Iterable[Path] = (
+        i for i in filter(path, include, exclude)
+        if i.name not in (_Journal.name, _Index.name)
+    )
+
+    def target(i: Path, hexdigest_: str) -> Path:
+        return _target(
+            i,
+            hexdigest_,
+            prefix,
+            drop_suffix,
+            case_,
+            flatten,
+            store,
+            fanout
+        )
+
+    known: dict[Path, str] = {}
+    originals: dict[Path, Path] = {}
+    if on_duplicate != 'overwrite':
+        paths = list(paths)
+        originals, known = _duplicates(
+            paths,
+            algorithm,
+            digest_cache,
+            target
+        )
+        paths = [i for i in paths if i not in originals]
+
+    renames: list[dict[str, str]] = []
+    sources: dict[Path, list[Path]] = {}  # target -> sources
+    cross_device: list[str] = []
+    no_op: list[str] = []
+    devices: dict[Path, int] = {}
+
+    def device(directory: Path) -> int:
+        if directory not in devices:
+            # directories of a store may not exist yet
+            while not directory.exists() and directory != directory.parent:
+                directory = directory.parent
+            devices[directory] = directory.stat().st_dev
+        return devices[directory]
+
+    for i, hexdigest_ in _hexdigests(
+        paths,
+        algorithm,
+        jobs,
+        digest_cache,
+        known
+    ):
+        target_ = target(i, hexdigest_)
+        renames.append(
+            {'source': str(i), 'digest': hexdigest_, 'target': str(target_)}
+        )
+        if target_ == i:
+            no_op.append(str(i))
+            continue
+        sources.setdefault(target_, []).append(i)
+        if (
+            (flatten or store is not None) and
+            device(i.parent) != device(target_.parent)
+        ):
+            cross_device.append(str(i))
+
+    # `apply_plan` moves these out of the way before their names are
+    # taken, unlike sources staying in place
+    moved = set(Path(i['source']) for i in renames) - set(map(Path, no_op))
+    collisions = [
+        {'target': str(target_), 'sources': [str(i) for i in group]}
+        for target_, group in sources.items()
+        if len(group) > 1 or (
+            # existing targets in a store hold the same content
+            store is None and target_.exists() and target_ not in moved
+        )
+    ]
+
+    return {
+        'cwd': os.getcwd(),
+        'on_duplicate': on_duplicate,
+        'store': None if store is None else str(store),
+        'renames': renames,
+        'duplicates': [
+            {'source': str(i), 'original': str(original)}
+            for i, original in originals.items()
+        ],
+        'collisions': collisions,
+        'cross_device': cross_device,
+        'no_op': no_op
+    }
+
+
+def apply_plan(plan_: dict, quiet: bool = False) -> list[Path]:
+    """
+    Carry out a plan returned by `plan`, without hashing any file.
+
+    No-op renames are skipped, as are renames whose source is gone and
+    whose target exists (done already, e.g. by an interrupted run), so
+    applying a plan again resumes it. Cross-device renames are done by
+    copying. Targets taken by files not renamed are left alone; targets
+    taken by sources to be renamed are renamed away first.
+
+    Returns
+    -------
+    list[Path] : Path instances to renamed files.
+    """
+    cwd = Path(plan_['cwd'])
+    no_op = set(plan_['no_op'])
+    entries = {
+        cwd / i['source']: i
+        for i in plan_['renames'] if i['source'] not in no_op
+    }
+    store = plan_.get('store')
+    index = None if store is None else _Index(cwd / store)
+
+    new_paths: list[Path] = []
+    renamed: dict[Path, Path] = {}
+    for source, moved_from, target in _order(
+        {i: cwd / j['target'] for i, j in entries.items()}
+    ):
+        if target != cwd / entries[source]['target']:
+            _move(moved_from, target)  # out of the way of a cycle
+            continue
+        if not moved_from.exists() and target.exists():
+            new = target
+        elif (
+            index is None and
+            target.exists() and
+            target not in entries and
+            target not in renamed.values()
+        ):
+            print(f"'{target}' exists, '{source}' skipped.", end='\n\n')
+            continue
+        else:
+            if index is not None:
+                target.parent.mkdir(parents=True, exist_ok=True)
+            new = _move(moved_from, target)
         new_paths.append(new)
+        renamed[source] = new
+        if index is not None:
+            index.put(source, entries[source]['digest'], new)
         if not quiet:
-            print(f"'{i}' -> '{new}'.", end='\n\n')
+            print(f"'{source}' -> '{new}'.", end='\n\n')
+
+    if index is not None:
+        index.close()
+
+    originals = {
+        cwd / i['source']: cwd / i['original'] for i in plan_['duplicates']
+    }
+    _settle(originals, renamed, plan_['on_duplicate'], quiet)
 
     return new_paths
 
 
+def lookup(store: Path | str, key: str) -> list[tuple[Path, str, Path]]:
+    """
+    Look up files moved into a content-addressed store by `rename`.
+
+    Parameters
+    ----------
+    store :
+        Specify the store.
+    key :
+        Original path of a file, or a hex digest.
+
+    Returns
+    -------
+    list[tuple[Path, str, Path]] :
+        `(original path, hexdigest, path in store)` of matching files.
+    """
+    if isinstance(store, str):
+        store = Path(store)
+
+    if not (store / _Index.name).exists():
+        raise FileNotFoundError(f"no index found at '{store}'.")
+
+    with _Index(store) as index:
+        found = index.by_source(key)
+        if found is not None:
+            digest_, target = found
+            return [(Path(os.path.abspath(key)), digest_, target)]
+        return [
+            (source, key.lower(), target)
+            for source, target in index.by_digest(key)
+        ]
+
+
+def rollback(path: Path | str | None = None, quiet: bool = False) -> list[Path]:
+    """
+    Undo renames recorded in the journal left by `rename(journal=True)`
+    under `path`, latest first, and remove the journal unless some
+    renames could not be undone (their original names are taken, or
+    their targets are gone), which are reported.
+
+    Hard links made for duplicates are kept, as their content is the
+    same anyway. With `on_duplicate='overwrite'`, duplicates renamed to
+    the same target are restored only once, under the last name.
+
+    Returns
+    -------
+    list[Path] : Path instances to restored files.
+    """
+    if path is None:
+        path = Path()
+    elif isinstance(path, str):
+        path = Path(path)
+
+    journal = _Journal(_root(path))
+    if not journal.path.exists():
+        raise FileNotFoundError(f"no journal found at '{journal.path}'.")
+
+    restored: list[Path] = []
+    restored_targets: set[Path] = set()
+    left = False
+    for source, target in reversed(journal.completed()):
+        if not target.exists():
+            # restored already, or overwritten by a later duplicate
+            if not source.exists() and target not in restored_targets:
+                print(
+                    f"'{target}' is gone, '{source}' not restored.",
+                    end='\n\n'
+                )
+                left = True
+            continue
+        if source.exists():
+            print(f"'{source}' exists, '{target}' not restored.", end='\n\n')
+            left = True
+            continue
+        target.rename(source)
+        restored.append(source)
+        restored_targets.add(target)
+        if not quiet:
+            print(f"'{target}' -> '{source}'.", end='\n\n')
+
+    if left:
+        print(f"Journal '{journal.path}' kept.", end='\n\n')
+    else:
+        journal.path.unlink()
+
+    return restored
+
+
 class _Help:
 
     path = """
@@ -125,15 +965,144 @@ class _Help:
     """
 
     algorithm = """
-        hash algorithm (available: 'md5', 'sha1', 'sha256' and 'sha512')
+        hash algorithm (available: 'md5', 'sha1', 'sha256', 'sha512',
+        'blake2b', 'blake2s', 'sha3_224', 'sha3_256', 'sha3_384' and
+        'sha3_512')
     """
 
     quiet = """
         if specified, run quietly
     """
 
+    jobs = """
+        number of threads hashing files concurrently; if 0, use
+        the default of the thread pool (default: 1)
+    """
+
+    no_cache = """
+        if specified, hash every file instead of reusing digests of
+        unchanged files from previous runs
+    """
+
+    on_duplicate = """
+        what to do with files duplicating an earlier one (available:
+        'overwrite', 'report', 'skip' and 'hardlink'); except for
+        'overwrite', duplicates are left under their names ('skip'),
+        also reported ('report') or replaced by hard links to the
+        renamed file ('hardlink')
+    """
+
+    journal = """
+        if specified, keep a journal in working directory; an
+        interrupted run is resumed by running again with this option,
+        without hashing files planned already
+    """
+
+    store = """
+        move files into this content-addressed store instead, under
+        directories named after leading digits of their digests (e.g.
+        'ab/cd/abcd...'), and index them by original path and digest;
+        overrides `--flatten`
+    """
+
+    fanout = """
+        levels of directories in the store (default: 2)
+    """
+
+    lookup = """
+        look up files in the store (`--store`) by original path or by
+        digest instead of renaming
+    """
+
+    dry_run = """
+        if specified, hash files and print what would be done as JSON
+        (including target collisions, cross-device moves and no-op
+        renames) instead of renaming
+    """
+
+    apply_plan = """
+        carry out a plan printed by `--dry-run` (read from stdin if
+        '-') without hashing files; not allowed with paths, which are
+        in the plan already
+    """
+
+    rollback = """
+        if specified, undo renames recorded in the journal left in
+        working directory instead of renaming
+    """
+
+    non_interactive = """
+        if specified, exit without waiting for a key press; implied by
+        `--dry-run`
+    """
+
+
+def _main(options: argparse.Namespace) -> None:
+    if options.apply_plan is not None:
+        if options.apply_plan == '-':
+            plans = json.load(sys.stdin)
+        else:
+            with open(options.apply_plan, encoding='utf-8') as f:
+                plans = json.load(f)
+        for i in plans:
+            apply_plan(i, options.quiet)
+        return None
+
+    if options.lookup is not None:
+        for i in options.lookup:
+            for source, hexdigest_, target in lookup(options.store, i):
+                print(f"'{source}' ({hexdigest_}) -> '{target}'.", end='\n\n')
+        return None
+
+    if not options.path:
+        options.path.append(Path())
+
+    if options.dry_run:
+        plans = [
+            plan(
+                i,
+                options.include,
+                options.exclude,
+                options.prefix,
+                options.drop_suffix,
+                options.case,
+                options.flatten,
+                options.algorithm,
+                options.jobs,
+                not options.no_cache,
+                options.on_duplicate,
+                options.store,
+                options.fanout
+            )
+            for i in options.path
+        ]
+        json.dump(plans, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return None
+
+    for i in options.path:
+        if options.rollback:
+            rollback(i, options.quiet)
+            continue
+        rename(
+            i,
+            options.include,
+            options.exclude,
+            options.prefix,
+            options.drop_suffix,
+            options.case,
+            options.flatten,
+            options.algorithm,
+            options.quiet,
+            options.jobs,
+            not options.no_cache,
+            options.on_duplicate,
+            options.journal,
+            options.store,
+            options.fanout
+        )
+
 
-@pavlov
 def main(args: Sequence[str] | None = None) -> None:
     parser = argparse.ArgumentParser('Hash-Rename')
     parser.add_argument('path', nargs='*', help=_Help.path)
@@ -174,7 +1143,7 @@ def main(args: Sequence[str] | None = None) -> None:
     parser.add_argument(
         '-a',
         '--algorithm',
-        choices=('md5', 'sha1', 'sha256', 'sha512'),
+        choices=get_args(Algorithm),
         default='sha256',
         help=_Help.algorithm
     )
@@ -184,24 +1153,99 @@ def main(args: Sequence[str] | None = None) -> None:
         action='store_true',
         help=_Help.quiet
     )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help=_Help.jobs,
+        metavar=''
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help=_Help.no_cache
+    )
+    parser.add_argument(
+        '-D',
+        '--on-duplicate',
+        choices=('overwrite', 'report', 'skip', 'hardlink'),
+        default='overwrite',
+        help=_Help.on_duplicate
+    )
+    parser.add_argument(
+        '-J',
+        '--journal',
+        action='store_true',
+        help=_Help.journal
+    )
+    parser.add_argument(
+        '-S',
+        '--store',
+        help=_Help.store,
+        metavar='DIR'
+    )
+    parser.add_argument(
+        '--fanout',
+        type=int,
+        default=2,
+        help=_Help.fanout,
+        metavar=''
+    )
+    parser.add_argument(
+        '--lookup',
+        action='extend',
+        nargs='+',
+        help=_Help.lookup,
+        metavar='KEY'
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help=_Help.dry_run
+    )
+    parser.add_argument(
+        '--apply-plan',
+        help=_Help.apply_plan,
+        metavar='FILE'
+    )
+    parser.add_argument(
+        '--rollback',
+        action='store_true',
+        help=_Help.rollback
+    )
+    parser.add_argument(
+        '-n',
+        '--non-interactive',
+        action='store_true',
+        help=_Help.non_interactive
+    )
 
     options = parser.parse_args(args)
 
-    if not options.path:
-        options.path.append(Path())
-
-    for i in options.path:
-        rename(
-            i,
-            options.include,
-            options.exclude,
-            options.prefix,
-            options.drop_suffix,
-            options.case,
-            options.flatten,
-            options.algorithm,
-            options.quiet
+    if options.jobs < 0:
+        parser.error(
+            f"argument -j/--jobs: value '{options.jobs}' is invalid, "
+            "expect 0 or more"
         )
+    if options.lookup is not None and options.store is None:
+        parser.error('argument --lookup: requires -S/--store')
+    if options.store is not None:
+        try:
+            _check_fanout(options.fanout, options.algorithm)
+        except ValueError as e:
+            parser.error(f'argument --fanout: {e}')
+    if options.apply_plan is not None and options.path:
+        parser.error('argument --apply-plan: not allowed with paths')
+    if options.dry_run and options.journal:
+        parser.error('argument --dry-run: not allowed with -J/--journal')
+    if options.dry_run and options.rollback:
+        parser.error('argument --dry-run: not allowed with --rollback')
+
+    if options.non_interactive or options.dry_run:
+        _main(options)  # keep stdout clean for the plan
+    else:
+        pavlov(_main)(options)
 
 
 if __name__ == '__main__':
@@ -5,13 +5,23 @@ from sys import version_info
 assert version_info >= (3, 10)
 
 import argparse
+import csv
+import hashlib
+import json
+import os
 import re
-from collections import Counter
+import sqlite3
+import sys
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import cache
 from pathlib import Path
 from textwrap import dedent
-from typing import Iterable, Sequence
+from typing import Any, Iterable, Iterator, Literal, Sequence, TextIO
 
-from utils import filter, pavlov
+from utils import filter, match, monitor, pavlov
 
 
 class _Stats(Counter):
@@ -64,6 +74,17 @@ class _Stats(Counter):
     def description(self, __value: str) -> None:
         self.__description = __value.strip()
 
+    def __reduce__(self) -> tuple:
+        # `Counter.__reduce__` passes counts as the first positional
+        # argument, which here is `header`.
+        return (
+            self.__class__,
+            (self.__header, self.__sep, self.__description),
+            None,
+            None,
+            iter(self.items())
+        )
+
     def line(self, key: str, name: str | None = None) -> str:
         name = key.title() if name is None else name
         return f'{name + ":":<28}{self[key]:>8}\n'
@@ -102,84 +123,329 @@ _PATTERN: re.Pattern = re.compile(
 )
 
 
-def statistics(
-    path: Path | str | None = None,
-    include: Iterable[str] | None = None,
-    exclude: Iterable[str] | None = None,
-    recursive: bool = False,
-    verbose: bool = False
-) -> None:
+_CHUNK_SIZE = 0x100000  # 1 M characters
 
-    if path is None:
-        path = Path()
-    elif isinstance(path, str):
-        path = Path(path)
+# Both start with a literal '\n', which lets `re` skip ahead quickly.
+# `_RUNS` is searched in reversed text, where `\n\s*` is a reversed
+# `(\s*\n)+` run.
+_RUNS: re.Pattern = re.compile(r'\n\s*')
+_PARAGRAPHS: re.Pattern = re.compile(r'\n\s*\n')
 
-    if verbose:
-        inventory: list[_Stats] = []
+_KEYS: dict[int, str] = {
+    1: 'cjk',
+    2: 'hiragana',
+    3: 'katakana',
+    4: 'words',
+    5: 'punctuations',
+    6: 'whitespaces',  # only for a single '\n'
+    8: 'whitespaces',
+    9: 'others'
+}
 
-    stats = _Stats()
-    count = 0
-    for i in filter(path, include, exclude, recursive):
+
+@cache
+def _classify(char: str) -> str:
+    """
+    Return the key `char` is counted to, following the alternatives
+    of `_PATTERN` in order.
+    """
+    match = _PATTERN.match(char)
+    if match is None or match.lastindex is None:
+        return _KEYS[9]
+    return _KEYS[match.lastindex]
+
+
+def _tally(stats: _Stats, text: str) -> None:
+    """
+    Count `text`, which neither starts nor ends with whitespaces, into
+    `stats`.
+
+    Instead of dispatching on every `_PATTERN` match, characters are
+    counted in bulk with `Counter` and classified once per distinct
+    character, while lines and paragraphs are derived from `(\s*\n)+`
+    runs, which are exactly the matches of the 6th alternative.
+    A run spans a whitespace sequence up to its last '\n', and holds
+    more than one '\n' iff `_PARAGRAPHS` matches within it.
+    """
+    for char, n in Counter(text).items():
+        key = _classify(char)
+        stats[key] += n
+        if key in ('cjk', 'hiragana', 'katakana'):
+            stats['words'] += n
+
+    _runs: list[str] = _RUNS.findall(text[::-1])  # reversed runs
+    if not _runs:
+        return None
+
+    stats['paragraphs'] += len(_PARAGRAPHS.findall(text))
+    stats['non_blank_lines'] += len(_runs)
+    stats['lines'] += text.count('\n')
+    # whitespaces within `(\s*\n)+` are not counted
+    stats['whitespaces'] -= sum(map(len, _runs))
+
+
+def _extend(space: list[int], text: str) -> None:
+    """
+    Extend an open whitespace sequence, kept as `[linefeeds, length up
+    to the last '\n', length after]`, by whitespaces `text`.
+    """
+    last = text.rfind('\n')
+    if last == -1:
+        space[2] += len(text)
+        return None
+    space[0] += text.count('\n')
+    space[1] += space[2] + last + 1
+    space[2] = len(text) - last - 1
+
+
+def _close(stats: _Stats, space: list[int]) -> None:
+    """
+    Count a whitespace sequence as `_tally` would, then reset it.
+    """
+    linefeeds, _, rest = space
+    # whitespaces within the `(\s*\n)+` run are not counted
+    if rest:
+        stats['whitespaces'] += rest
+    if linefeeds:
+        if linefeeds > 1:
+            stats['paragraphs'] += 1
+        stats['non_blank_lines'] += 1
+        stats['lines'] += linefeeds
+    space[:] = [0, 0, 0]
+
+
+def _count(path: Path) -> _Stats | None:
+    """
+    Count a single file. Return None if it is not UTF-8 encoded text,
+    an empty `_Stats` if it is empty.
+
+    The file is read in chunks of `_CHUNK_SIZE` characters. Since
+    `(\s*\n)+` may run across chunk boundaries while every other
+    alternative matches a single character, whitespaces at either end
+    of a chunk are not kept but counted into the state of the open
+    whitespace sequence, so memory is bounded however long it runs.
+
+    Defined at module level so that it can be pickled to worker processes.
+    """
+    _stats = _Stats(str(path), '-')
+    _space = [0, 0, 0]
+    _empty = True
+    try:
+        with open(path, encoding='utf-8') as f:
+            while _chunk := f.read(_CHUNK_SIZE):
+                _empty = False
+                _stripped = _chunk.lstrip()
+                _extend(_space, _chunk[:len(_chunk) - len(_stripped)])
+                if not _stripped:
+                    continue
+                _close(_stats, _space)
+                _body = _stripped.rstrip()
+                _tally(_stats, _body)
+                _extend(_space, _stripped[len(_body):])
+    except UnicodeDecodeError:
+        return None
+
+    if _empty:
+        return _stats
+
+    # linefeeds of the last `(\s*\n)+` match, if it ends the file
+    _linefeeds_at_EOF: int = _space[0] if _space[2] == 0 else 0
+    _close(_stats, _space)
+    if _linefeeds_at_EOF == 0:
+        _stats['paragraphs'] += 1
+        _stats['non_blank_lines'] += 1
+        _stats['lines'] += 1
+    elif _linefeeds_at_EOF == 1:
+        _stats['paragraphs'] += 1
+    _stats['chars_no_spaces'] = _stats['words'] + _stats['punctuations'] + _stats['others']
+    _stats['chars_with_spaces'] = _stats['chars_no_spaces'] + _stats['whitespaces']
+    return _stats
+
+
+class _Cache:
+    """
+    On-disk counts of files under `root`, keyed by path, size, mtime_ns
+    and inode, so that unchanged files are never read again.
+
+    The database is kept under '$XDG_CACHE_HOME/inkutils/stats' (one per
+    working directory), so that the tree being counted is never
+    modified. Non-UTF-8 files are cached as well (with NULL counts), thus
+    skipped without being opened. Entries of files which no longer exist
+    are evicted on `close`.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.path = self.location(root)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.__connection = sqlite3.connect(self.path)
+        self.__connection.execute(
+            'CREATE TABLE IF NOT EXISTS stats ('
+            'path TEXT PRIMARY KEY, '
+            'size INTEGER, '
+            'mtime_ns INTEGER, '
+            'inode INTEGER, '
+            'counts TEXT'
+            ')'
+        )
+        self.__seen: set[str] = set()
+
+    @staticmethod
+    def location(root: Path) -> Path:
+        cache_home = os.environ.get('XDG_CACHE_HOME')
+        if cache_home:
+            directory = Path(cache_home) / 'inkutils/stats'
+        else:
+            directory = Path.home() / '.cache/inkutils/stats'
+        key = hashlib.sha256(os.fsencode(os.path.abspath(root))).hexdigest()
+        return directory / f'{key[:32]}.sqlite3'
+
+    @classmethod
+    def open(cls, root: Path) -> '_Cache | None':
+        """
+        Return the cache of `root`, or None if it can not be opened, in
+        which case files are simply counted.
+        """
         try:
-            with open(i, encoding='utf-8') as f:
-                _raw = f.read()
-        except UnicodeDecodeError:
-            continue
-
-        count += 1
-
-        _stats = _Stats(str(i), '-')
-        _groups: list[tuple[str, ...]] = _PATTERN.findall(_raw)
-
-        if not _groups:
-            continue
-
-        for j, k, l, m, n, o, _, p, q in _groups:  # `_` for '(\s*\n)'
-            if j:  # CJK Unified Ideographs and CJK Extension
-                _stats['cjk'] += 1
-                _stats['words'] += 1
-            elif k:  # Hiragana
-                _stats['hiragana'] += 1
-                _stats['words'] += 1
-            elif l:  # Katakana
-                _stats['katakana'] += 1
-                _stats['words'] += 1
-            elif m:  # r'\w'
-                _stats['words'] += 1
-            elif n:  # r'\S'
-                _stats['punctuations'] += 1
-            elif o:  # r'(\s*\n)+'
-                _linefeeds: int = o.count('\n')
-                if _linefeeds > 1:
-                    _stats['paragraphs'] += 1
-                _stats['non_blank_lines'] += 1
-                _stats['lines'] += _linefeeds
-                _stats['whitespaces'] += len(p)
-            elif p:  # r'\s'
-                _stats['whitespaces'] += 1
-            elif q: # r'.'
-                _stats['others'] += 1
-
-        _linefeeds_at_EOF: int = _groups[-1][6].count('\n')
-        if _linefeeds_at_EOF == 0:
-            _stats['paragraphs'] += 1
-            _stats['non_blank_lines'] += 1
-            _stats['lines'] += 1
-        elif _linefeeds_at_EOF == 1:
-            _stats['paragraphs'] += 1
-        _stats['chars_no_spaces'] = _stats['words'] + _stats['punctuations'] + _stats['others']
-        _stats['chars_with_spaces'] = _stats['chars_no_spaces'] + _stats['whitespaces']
-        stats.update(_stats)
+            return cls(root)
+        except (OSError, sqlite3.Error):
+            return None
 
-        if verbose:
-            inventory.append(_stats)
+    def __enter__(self) -> '_Cache':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _key(self, path: Path) -> str:
+        return os.path.relpath(path, self.root)
+
+    def get(
+        self,
+        path: Path,
+        stat: os.stat_result
+    ) -> tuple[bool, _Stats | None]:
+        """
+        Return `(hit, stats)`; `stats` is what `_count(path)` would return.
+        """
+        key = self._key(path)
+        self.__seen.add(key)
+        row = self.__connection.execute(
+            'SELECT counts FROM stats '
+            'WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?',
+            (key, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        ).fetchone()
+        if row is None:
+            return False, None
+        if row[0] is None:
+            return True, None
+        _stats = _Stats(str(path), '-')
+        _stats.update(json.loads(row[0]))
+        return True, _stats
+
+    def put(
+        self,
+        path: Path,
+        stat: os.stat_result,
+        stats: _Stats | None
+    ) -> None:
+        self.__connection.execute(
+            'INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?, ?)',
+            (
+                self._key(path),
+                stat.st_size,
+                stat.st_mtime_ns,
+                stat.st_ino,
+                None if stats is None else json.dumps(stats)
+            )
+        )
+
+    def close(self) -> None:
+        stale = [
+            (i,)
+            for i, in self.__connection.execute('SELECT path FROM stats')
+            if i not in self.__seen and not (self.root / i).exists()
+        ]
+        self.__connection.executemany('DELETE FROM stats WHERE path = ?', stale)
+        self.__connection.commit()
+        self.__connection.close()
+
+    @classmethod
+    def clear(cls, root: Path) -> None:
+        cls.location(root).unlink(missing_ok=True)
+
+
+def _map(
+    paths: Iterable[Path],
+    jobs: int = 1,
+    cache: _Cache | None = None
+) -> Iterator[tuple[Path, _Stats | None]]:
+    """
+    Yield `(path, _count(path))` in the order of `paths`.
 
+    If `jobs` is not 1, files are counted by a process pool. At most
+    `jobs * 4` files are in flight, so that a huge tree is never turned
+    into a huge list of futures before the first result comes back.
+
+    If `cache` is given, files found in it are not counted at all.
+    """
+    if jobs == 1:
+        for i in paths:
+            if cache is None:
+                yield i, _count(i)
+                continue
+            stat = i.stat()
+            hit, _stats = cache.get(i, stat)
+            if not hit:
+                _stats = _count(i)
+                cache.put(i, stat, _stats)
+            yield i, _stats
+        return None
+
+    jobs = jobs or os.cpu_count() or 1
+    window = jobs * 4
+    with ProcessPoolExecutor(jobs) as executor:
+        pending: deque[
+            tuple[Path, os.stat_result | None, Future[_Stats | None]]
+        ] = deque()
+
+        def pop() -> tuple[Path, _Stats | None]:
+            path, stat, future = pending.popleft()
+            _stats = future.result()
+            if cache is not None and stat is not None:
+                cache.put(path, stat, _stats)
+            return path, _stats
+
+        for i in paths:
+            if cache is None:
+                pending.append((i, None, executor.submit(_count, i)))
+            else:
+                stat = i.stat()
+                hit, _stats = cache.get(i, stat)
+                if hit:
+                    future: Future[_Stats | None] = Future()
+                    future.set_result(_stats)
+                    pending.append((i, None, future))
+                else:
+                    pending.append((i, stat, executor.submit(_count, i)))
+            if len(pending) >= window:
+                yield pop()
+        while pending:
+            yield pop()
+
+    return None
+
+
+def _report(
+    stats: _Stats,
+    count: int,
+    inventory: Iterable[_Stats] | None = None
+) -> str:
     stats.description = f'{"Files:":<28}{count:>8}'
 
     message = str(stats)
 
-    if verbose:
+    if inventory is not None:
         details = '\n\n'.join(str(i) for i in inventory)
         message += (
             '\n'
@@ -192,7 +458,249 @@ def statistics(
             details
         )
 
-    print(message)
+    return message
+
+
+_FIELDS: tuple[str, ...] = (
+    'paragraphs',
+    'non_blank_lines',
+    'lines',
+    'words',
+    'cjk',
+    'hiragana',
+    'katakana',
+    'punctuations',
+    'whitespaces',
+    'others',
+    'chars_no_spaces',
+    'chars_with_spaces'
+)
+
+
+class _Writer(ABC):
+    """
+    Write per-file records as soon as they are counted, then the total.
+    """
+
+    def __init__(self, file: TextIO | None = None) -> None:
+        self.file = sys.stdout if file is None else file
+
+    @staticmethod
+    def _row(
+        type_: str,
+        path: str | None,
+        files: int,
+        stats: _Stats
+    ) -> dict[str, Any]:
+        row: dict[str, Any] = {'type': type_, 'path': path, 'files': files}
+        row.update((i, stats[i]) for i in _FIELDS)
+        return row
+
+    @abstractmethod
+    def _write(self, row: dict[str, Any]) -> None:
+        ...
+
+    def record(self, path: Path, stats: _Stats) -> None:
+        self._write(self._row('file', str(path), 1, stats))
+
+    def total(self, stats: _Stats, count: int) -> None:
+        self._write(self._row('total', None, count, stats))
+        self.file.flush()
+
+
+class _NDJSONWriter(_Writer):
+
+    def _write(self, row: dict[str, Any]) -> None:
+        self.file.write(json.dumps(row) + '\n')
+
+
+class _JSONWriter(_Writer):
+    """
+    `{"files": [...], "total": {...}}`, written incrementally.
+    """
+
+    __opened = False
+
+    def _write(self, row: dict[str, Any]) -> None:
+        if not self.__opened:
+            self.file.write('{"files": [')
+            self.__opened = True
+        elif row['type'] == 'file':
+            self.file.write(',')
+        if row['type'] == 'file':
+            self.file.write('\n    ' + json.dumps(row))
+        else:
+            self.file.write('\n], "total": ' + json.dumps(row) + '}\n')
+
+
+class _CSVWriter(_Writer):
+
+    def __init__(self, file: TextIO | None = None) -> None:
+        super().__init__(file)
+        self.__writer = csv.DictWriter(
+            self.file,
+            ('type', 'path', 'files', *_FIELDS),
+            lineterminator='\n'
+        )
+        self.__writer.writeheader()
+
+    def _write(self, row: dict[str, Any]) -> None:
+        self.__writer.writerow(row)
+
+
+def statistics(
+    path: Path | str | None = None,
+    include: Iterable[str] | None = None,
+    exclude: Iterable[str] | None = None,
+    recursive: bool = False,
+    verbose: bool = False,
+    jobs: int = 1,
+    cache: bool = True,
+    clear_cache: bool = False,
+    watch: bool = False,
+    format_: Literal['text', 'json', 'csv', 'ndjson'] = 'text'
+) -> None:
+    """
+    Parameters
+    ----------
+    path :
+        Specify working directory. If None, use current working directory;
+        If is a file, `include` and `exclude` will be omitted.
+    include :
+        Pass a Iterable of which every elements are str specifying file
+        types to be counted. Both suffix and extension are acceptable.
+        If None, all files under working directory not excluded
+        will be counted.
+    exclude :
+        Pass a Iterable of which every elements are str specifying file
+        types to be excluded. Both suffix and extension are acceptable.
+    recursive :
+        If True, count files recursively.
+    verbose :
+        If True, print statistics of every file as well.
+    jobs :
+        Number of worker processes. If 1, count files in current process;
+        If 0, use as many workers as CPUs. Directories are listed by as
+        many threads as well, and counting starts while the tree is
+        still being walked.
+    cache :
+        If True, reuse counts of unchanged files from previous runs, which
+        are stored under '$XDG_CACHE_HOME/inkutils/stats'.
+    clear_cache :
+        If True, drop the stored counts before counting.
+    watch :
+        If True, keep counting changed files and print statistics again
+        on every change, until interrupted. Only available with 'text'
+        format.
+    format_ :
+        Output format. With formats other than 'text', a record is written
+        for every file as soon as it is counted, followed by the total.
+    """
+    if path is None:
+        path = Path()
+    elif isinstance(path, str):
+        path = Path(path)
+
+    writer: _Writer | None
+    match format_.lower():
+        case 'text':
+            writer = None
+        case 'json':
+            writer = _JSONWriter()
+        case 'csv':
+            writer = _CSVWriter()
+        case 'ndjson':
+            writer = _NDJSONWriter()
+        case _:
+            raise ValueError(
+                f"value '{format_}' is invalid, "
+                "expect 'text', 'json', 'csv' or 'ndjson'."
+            )
+    if watch and writer is not None:
+        raise ValueError("`watch` is only available with 'text' format.")
+
+    root = path.parent if path.is_file() else path
+    if clear_cache:
+        _Cache.clear(root)
+
+    paths = filter(path, include, exclude, recursive, jobs=jobs)
+
+    records: dict[Path, _Stats | None] = {}
+    stats = _Stats()
+    count = 0
+    _cache = _Cache.open(root) if cache else None
+    with _cache if _cache is not None else nullcontext():
+        for i, _stats in _map(paths, jobs, _cache):
+            if (verbose and writer is None) or watch:
+                records[i] = _stats
+
+            if _stats is None:
+                continue
+
+            count += 1
+
+            if writer is not None:
+                writer.record(i, _stats)
+
+            if not _stats:
+                continue
+
+            stats.update(_stats)
+
+    if writer is not None:
+        writer.total(stats, count)
+        return None
+
+    def inventory() -> Iterable[_Stats] | None:
+        if verbose:
+            return (i for i in records.values() if i)
+        return None
+
+    if not watch:
+        print(_report(stats, count, inventory()))
+        return None
+
+    def wanted(file: Path) -> bool:
+        if not file.is_file():
+            return False
+        if path.is_file():
+            return file == path
+        if not recursive and file.parent != root:
+            return False
+        return match(file, include, exclude)
+
+    clear = '\033[H\033[J' if sys.stdout.isatty() else ''
+    print(clear + _report(stats, count, inventory()), flush=True)
+    try:
+        for changed in monitor(root, recursive):
+            files: set[Path] = set()
+            for i in changed:
+                files.add(i)
+                if i in records:
+                    continue
+                # maybe a directory created, moved or deleted as a whole,
+                # which is no directory any more if moved or deleted
+                files.update(j for j in records if i in j.parents)
+                if i.is_dir():
+                    files.update(filter(i, include, exclude, True))
+            if not files:
+                continue
+            for i in files:
+                if i in records:
+                    _stats = records.pop(i)
+                    if _stats is not None:
+                        count -= 1
+                        stats.subtract(_stats)
+                if wanted(i):
+                    records[i] = _stats = _count(i)
+                    if _stats is not None:
+                        count += 1
+                        stats.update(_stats)
+            print(clear + _report(stats, count, inventory()), flush=True)
+    except KeyboardInterrupt:
+        pass
+
+    return None
 
 
 class _Help:
@@ -221,8 +729,51 @@ class _Help:
         print verbosely
     """
 
+    jobs = """
+        number of worker processes; if 0, use as many as CPUs
+        (default: 1)
+    """
+
+    no_cache = """
+        if specified, count every file again instead of reusing counts
+        of unchanged files from previous runs
+    """
+
+    clear_cache = """
+        if specified, drop counts stored by previous runs
+    """
+
+    watch = """
+        if specified, keep running and print statistics again whenever
+        a file changes (only with 'text' format)
+    """
+
+    format = """
+        output format (available: 'text', 'json', 'csv' and 'ndjson');
+        formats other than 'text' write a record for every file as soon
+        as it is counted, and imply `--non-interactive`
+    """
+
+    non_interactive = """
+        if specified, exit without waiting for a key press
+    """
+
+
+def _main(options: argparse.Namespace) -> None:
+    statistics(
+        options.path,
+        options.include,
+        options.exclude,
+        options.recursive,
+        options.verbose,
+        options.jobs,
+        not options.no_cache,
+        options.clear_cache,
+        options.watch,
+        options.format
+    )
+
 
-@pavlov
 def main(args: Sequence[str] | None = None) -> None:
     parser = argparse.ArgumentParser('Stats')
     parser.add_argument('path', nargs='?', help=_Help.path)
@@ -254,16 +805,58 @@ def main(args: Sequence[str] | None = None) -> None:
         action='store_true',
         help=_Help.verbose
     )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help=_Help.jobs,
+        metavar=''
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help=_Help.no_cache
+    )
+    parser.add_argument(
+        '--clear-cache',
+        action='store_true',
+        help=_Help.clear_cache
+    )
+    parser.add_argument(
+        '-w',
+        '--watch',
+        action='store_true',
+        help=_Help.watch
+    )
+    parser.add_argument(
+        '-f',
+        '--format',
+        choices=('text', 'json', 'csv', 'ndjson'),
+        default='text',
+        help=_Help.format
+    )
+    parser.add_argument(
+        '-n',
+        '--non-interactive',
+        action='store_true',
+        help=_Help.non_interactive
+    )
 
     options = parser.parse_args(args)
 
-    statistics(
-        options.path,
-        options.include,
-        options.exclude,
-        options.recursive,
-        options.verbose
-    )
+    if options.watch and options.format != 'text':
+        parser.error("argument -w/--watch: only available with 'text' format")
+    if options.jobs < 0:
+        parser.error(
+            f"argument -j/--jobs: value '{options.jobs}' is invalid, "
+            "expect 0 or more"
+        )
+
+    if options.non_interactive or options.format != 'text':
+        _main(options)
+    else:
+        pavlov(_main)(options)
 
 
 if __name__ == '__main__':
@@ -1,5 +1,8 @@
-from .digest import Digest, digest, hexdigest
-from .filter import filter
+from .digest import Algorithm, Digest, DigestCache, digest, hexdigest
+from .duplicates import duplicates
+from .filter import filter, match
+from .ignore import Ignore, compile_ignore, read_ignore
+from .monitor import monitor
 from .pavlov import Pavlov, pavlov
 from .randrange import randrange
 from .wait import wait
@@ -2,69 +2,339 @@ from sys import version_info
 
 assert version_info >= (3, 10)
 
+import atexit
 import hashlib
+import io
+import mmap
+import os
+import sqlite3
+import stat
+import threading
+import time
 from pathlib import Path
-from typing import Literal
+from typing import Callable, Iterable, Literal, TypeAlias
+
+# blake2 constructors are classes of their own, not `hashlib._Hash`
+_Hash: TypeAlias = 'hashlib._Hash | hashlib.blake2b | hashlib.blake2s'
+
+Algorithm = Literal[
+    'md5',
+    'sha1',
+    'sha256',
+    'sha512',
+    'blake2b',
+    'blake2s',
+    'sha3_224',
+    'sha3_256',
+    'sha3_384',
+    'sha3_512'
+]
+
+_BUFFER_SIZE = 0x1000000  # 16 MB
+_MMAP_THRESHOLD = 0x4000000  # 64 MB
+
+_local = threading.local()
+
+
+def _buffer() -> memoryview:
+    """
+    Return a reusable buffer of `_BUFFER_SIZE` bytes, one per thread.
+    """
+    try:
+        return _local.buffer
+    except AttributeError:
+        _local.buffer = memoryview(bytearray(_BUFFER_SIZE))
+        return _local.buffer
+
+
+def _update(hashes: Iterable[_Hash], f: io.RawIOBase) -> None:
+    """
+    Feed the content of `f` to every one of `hashes` in a single pass,
+    without allocating a new bytes object per chunk: large regular files
+    are memory-mapped, others are read into a reusable buffer.
+    """
+    hashes = tuple(hashes)
+    st = os.fstat(f.fileno())
+    if stat.S_ISREG(st.st_mode) and st.st_size >= _MMAP_THRESHOLD:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            advise = hasattr(mmap, 'MADV_DONTNEED')
+            if advise:
+                m.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(m) as view:
+                for offset in range(0, len(m), _BUFFER_SIZE):
+                    chunk = view[offset:offset + _BUFFER_SIZE]
+                    for hash in hashes:
+                        hash.update(chunk)
+                    chunk.release()
+                    if advise:
+                        # drop hashed pages, or they count towards RSS
+                        m.madvise(mmap.MADV_DONTNEED, offset, _BUFFER_SIZE)
+        return None
+    buffer = _buffer()
+    while n := f.readinto(buffer):
+        chunk = buffer[:n]
+        for hash in hashes:
+            hash.update(chunk)
+    return None
+
+
+def _constructor(algorithm: str) -> Callable[[], _Hash]:
+    match algorithm:
+        case 'md5':
+            return hashlib.md5
+        case 'sha1':
+            return hashlib.sha1
+        case 'sha256':
+            return hashlib.sha256
+        case 'sha512':
+            return hashlib.sha512
+        case 'blake2b':
+            return hashlib.blake2b
+        case 'blake2s':
+            return hashlib.blake2s
+        case 'sha3_224':
+            return hashlib.sha3_224
+        case 'sha3_256':
+            return hashlib.sha3_256
+        case 'sha3_384':
+            return hashlib.sha3_384
+        case 'sha3_512':
+            return hashlib.sha3_512
+        case _:
+            raise ValueError(
+                f"value '{algorithm}' is invalid, "
+                "expect 'md5', 'sha1', 'sha256', 'sha512', 'blake2b', "
+                "'blake2s', 'sha3_224', 'sha3_256', 'sha3_384' or 'sha3_512'."
+            )
+
+
+class DigestCache:
+    """
+    On-disk digests keyed by (device, inode, size, mtime_ns, algorithm),
+    so that a hit costs a single `stat()`. Least recently used entries
+    are evicted once there are more than `capacity` of them.
+
+    Insertions and usage times are kept in memory and written in a single
+    transaction every `batch` operations and on `flush`/`close` (the
+    default cache is closed at exit), so a hit never writes to disk.
+
+    Safe to share between threads.
+    """
+    __instance: 'DigestCache | None' = None
+
+    def __init__(
+        self,
+        path: Path | str | None = None,
+        capacity: int = 1000000,
+        batch: int = 1000
+    ) -> None:
+        if path is None:
+            cache_home = os.environ.get('XDG_CACHE_HOME')
+            if cache_home:
+                path = Path(cache_home) / 'inkutils/digest.sqlite3'
+            else:
+                path = Path.home() / '.cache/inkutils/digest.sqlite3'
+        elif isinstance(path, str):
+            path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.capacity = capacity
+        self.batch = batch
+        self.__lock = threading.Lock()
+        self.__pending: dict[tuple, bytes] = {}  # key -> digest, to insert
+        self.__used: dict[tuple, int] = {}  # key -> usage time, to update
+        self.__connection = sqlite3.connect(
+            path,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self.__connection.execute('PRAGMA journal_mode = WAL')
+        self.__connection.execute('PRAGMA synchronous = NORMAL')
+        self.__connection.execute(
+            'CREATE TABLE IF NOT EXISTS digests ('
+            'device INTEGER, '
+            'inode INTEGER, '
+            'size INTEGER, '
+            'mtime_ns INTEGER, '
+            'algorithm TEXT, '
+            'digest BLOB, '
+            'used INTEGER, '
+            'PRIMARY KEY (device, inode, size, mtime_ns, algorithm)'
+            ')'
+        )
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS digests_used ON digests (used)'
+        )
+
+    @classmethod
+    def default(cls) -> 'DigestCache':
+        """
+        Return the cache shared by all scripts, created on first use.
+        """
+        if cls.__instance is None:
+            cls.__instance = cls()
+            atexit.register(cls.__instance.close)
+        return cls.__instance
+
+    @staticmethod
+    def _key(st: os.stat_result, algorithm: str) -> tuple:
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, algorithm)
+
+    def get(self, st: os.stat_result, algorithm: str) -> bytes | None:
+        key = self._key(st, algorithm)
+        with self.__lock:
+            digest = self.__pending.get(key)
+            if digest is None:
+                row = self.__connection.execute(
+                    'SELECT digest FROM digests WHERE device = ? AND inode = ? '
+                    'AND size = ? AND mtime_ns = ? AND algorithm = ?',
+                    key
+                ).fetchone()
+                if row is None:
+                    return None
+                digest = row[0]
+                self.__used[key] = time.time_ns()
+                self._pend()
+        return digest
+
+    def put(self, st: os.stat_result, algorithm: str, digest: bytes) -> None:
+        with self.__lock:
+            self.__pending[self._key(st, algorithm)] = digest
+            self._pend()
+
+    def _pend(self) -> None:
+        if len(self.__pending) + len(self.__used) >= self.batch:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not (self.__pending or self.__used):
+            return None
+        now = time.time_ns()
+        with self.__connection:  # one transaction
+            self.__connection.execute('BEGIN')
+            self.__connection.executemany(
+                'INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ((*k, v, now) for k, v in self.__pending.items())
+            )
+            self.__connection.executemany(
+                'UPDATE digests SET used = ? WHERE device = ? AND inode = ? '
+                'AND size = ? AND mtime_ns = ? AND algorithm = ?',
+                ((v, *k) for k, v in self.__used.items())
+            )
+            if self.__pending:
+                self._evict()
+        self.__pending.clear()
+        self.__used.clear()
+
+    def _evict(self) -> None:
+        # keep 10% headroom, so that eviction does not run on every flush
+        (count,), = self.__connection.execute('SELECT COUNT(*) FROM digests')
+        if count > self.capacity:
+            self.__connection.execute(
+                'DELETE FROM digests WHERE rowid IN ('
+                'SELECT rowid FROM digests ORDER BY used LIMIT ?'
+                ')',
+                (count - self.capacity * 9 // 10,)
+            )
+
+    def flush(self) -> None:
+        """
+        Write pending insertions and usage times.
+        """
+        with self.__lock:
+            self._flush()
+
+    def close(self) -> None:
+        with self.__lock:
+            self._flush()
+            self.__connection.close()
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__pending.clear()
+            self.__used.clear()
+            self.__connection.execute('DELETE FROM digests')
 
 
 class Digest:
+    """
+    Digests of a file. If several algorithms are given, the file is read
+    only once and every chunk is fed to all of them; the first one is
+    the primary algorithm used by `hash`, `digest` and `hexdigest`.
+    """
 
     def __init__(
         self,
         path: Path | str,
-        algorithm: Literal['md5', 'sha1', 'sha256', 'sha512'] = 'sha256'
+        algorithm: Algorithm | Iterable[Algorithm] = 'sha256',
+        cache: DigestCache | None = None
     ) -> None:
         self.path = path
         self.set_algorithm(algorithm)
-        self.__hash: 'hashlib._Hash' | None = None
+        self.cache = cache
+        self.__hashes: dict[str, _Hash] | None = None
 
     def set_algorithm(
         self,
-        algorithm: Literal['md5', 'sha1', 'sha256', 'sha512']
+        algorithm: Algorithm | Iterable[Algorithm]
     ) -> None:
-        match algorithm.strip().lower():
-            case 'md5':
-                self.algorithm = hashlib.md5
-            case 'sha1':
-                self.algorithm = hashlib.sha1
-            case 'sha256':
-                self.algorithm = hashlib.sha256
-            case 'sha512':
-                self.algorithm = hashlib.sha512
-            case _:
-                raise ValueError(
-                    f"value '{algorithm}' is invalid, "
-                    "expect 'md5', 'sha1', 'sha256' or 'sha512'."
-                )
+        if isinstance(algorithm, str):
+            algorithm = (algorithm,)
+        names = tuple(dict.fromkeys(i.strip().lower() for i in algorithm))
+        if not names:
+            raise ValueError('expect at least one algorithm.')
+        self.algorithms = {i: _constructor(i) for i in names}
+        self.name = names[0]
+        self.algorithm = self.algorithms[self.name]
+        self.__hashes = None
 
     @property
-    def hash(self) -> 'hashlib._Hash':
-        if self.__hash is None:
-            self.__hash = self.algorithm()
-            with open(self.path, 'rb') as f:
-                while True:
-                    data = f.read(0x1000000)  # 16 MB
-                    if not data:
-                        break
-                    self.__hash.update(data)
-        return self.__hash
+    def hashes(self) -> dict[str, _Hash]:
+        if self.__hashes is None:
+            self.__hashes = {i: j() for i, j in self.algorithms.items()}
+            with open(self.path, 'rb', buffering=0) as f:
+                _update(self.__hashes.values(), f)
+        return self.__hashes
+
+    @property
+    def hash(self) -> _Hash:
+        return self.hashes[self.name]
+
+    def digests(self) -> dict[str, bytes]:
+        if self.cache is None or self.__hashes is not None:
+            return {i: j.digest() for i, j in self.hashes.items()}
+        st = os.stat(self.path)
+        result: dict[str, bytes] = {}
+        for i in self.algorithms:
+            value = self.cache.get(st, i)
+            if value is None:
+                # the first miss computes all of them in a single pass
+                value = self.hashes[i].digest()
+                self.cache.put(st, i, value)
+            result[i] = value
+        return result
+
+    def hexdigests(self) -> dict[str, str]:
+        return {i: j.hex() for i, j in self.digests().items()}
 
     def digest(self) -> bytes:
-        return self.hash.digest()
+        return self.digests()[self.name]
 
     def hexdigest(self) -> str:
-        return self.hash.hexdigest()
+        return self.digest().hex()
 
 
 def digest(
     path: Path | str,
-    algorithm: Literal['md5', 'sha1', 'sha256', 'sha512'] = 'sha256'
+    algorithm: Algorithm = 'sha256',
+    cache: DigestCache | None = None
 ) -> bytes:
-    return Digest(path, algorithm).digest()
+    return Digest(path, algorithm, cache).digest()
 
 
 def hexdigest(
     path: Path | str,
-    algorithm: Literal['md5', 'sha1', 'sha256', 'sha512'] = 'sha256'
+    algorithm: Algorithm = 'sha256',
+    cache: DigestCache | None = None
 ) -> str:
-    return Digest(path, algorithm).hexdigest()
+    return Digest(path, algorithm, cache).hexdigest()
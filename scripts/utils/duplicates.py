@@ -0,0 +1,80 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Iterable
+
+from .digest import Algorithm, DigestCache, digest
+
+
+def _sample(path: Path, size: int) -> bytes:
+    """
+    Return a digest of the first and last `size` bytes of `path`.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(size)
+        f.seek(-size, os.SEEK_END)
+        tail = f.read(size)
+    return hashlib.blake2b(head + tail).digest()
+
+
+def duplicates(
+    paths: Iterable[Path | str],
+    algorithm: Algorithm = 'sha256',
+    cache: DigestCache | None = None,
+    sample: int = 0x1000,
+    digests: dict[Path, bytes] | None = None
+) -> list[list[Path]]:
+    """
+    Find files with identical content.
+
+    Candidates are grouped by size first, then by a digest of their first
+    and last `sample` bytes, and only files still colliding are hashed in
+    full, so most files are never read at all.
+
+    Parameters
+    ----------
+    paths :
+        Files to be compared.
+    algorithm :
+        Hash algorithm used to compare full contents.
+    cache :
+        Digest cache consulted before hashing full contents.
+    sample :
+        Number of bytes sampled from both ends of a file.
+    digests :
+        If not None, full digests computed are stored into it, so that
+        callers need not hash those files again.
+
+    Returns
+    -------
+    list[list[Path]] :
+        Groups of duplicates with more than one member. Groups and their
+        members keep the order of `paths`.
+    """
+    by_size: dict[int, list[Path]] = {}
+    for i in paths:
+        i = Path(i)
+        by_size.setdefault(i.stat().st_size, []).append(i)
+
+    groups: list[list[Path]] = []
+    for size, candidates in by_size.items():
+        if len(candidates) < 2:
+            continue
+        if size > sample * 2:
+            by_sample: dict[bytes, list[Path]] = {}
+            for i in candidates:
+                by_sample.setdefault(_sample(i, sample), []).append(i)
+            narrowed = [i for i in by_sample.values() if len(i) > 1]
+        else:
+            # sampling would read the whole file anyway
+            narrowed = [candidates]
+        for group in narrowed:
+            by_digest: dict[bytes, list[Path]] = {}
+            for i in group:
+                digest_ = digest(i, algorithm, cache)
+                if digests is not None:
+                    digests[i] = digest_
+                by_digest.setdefault(digest_, []).append(i)
+            groups.extend(j for j in by_digest.values() if len(j) > 1)
+
+    return groups
@@ -1,12 +1,220 @@
+import os
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Generator, Iterable
+from typing import Generator, Iterable, Iterator, NamedTuple
+
+from .ignore import Ignore, compile_ignore, read_ignore
+
+
+def _normalize(suffixes: Iterable[str] | None) -> set[str] | None:
+    if suffixes is None:
+        return None
+    return set(f'.{i.lstrip(".")}' for i in suffixes)
+
+
+def _suffix(name: str) -> str:
+    """
+    Same as `PurePath(name).suffix`, without creating a path object.
+    """
+    i = name.rfind('.')
+    if 0 < i < len(name) - 1:
+        return name[i:]
+    return ''
+
+
+def _suffixes(name: str) -> str:
+    """
+    Same as `''.join(PurePath(name).suffixes)`, without creating a path
+    object.
+    """
+    if name.endswith('.'):
+        return ''
+    name = name.lstrip('.')
+    i = name.find('.')
+    if i == -1:
+        return ''
+    return name[i:]
+
+
+def _match(
+    name: str,
+    include: set[str] | None,
+    exclude: set[str] | None
+) -> bool:
+    suffix = _suffix(name)
+    suffixes = _suffixes(name)
+    if exclude is not None:
+        if suffix in exclude or suffixes in exclude:
+            return False
+    if include is not None:
+        if suffix not in include and suffixes not in include:
+            return False
+    return True
+
+
+def match(
+    path: Path | str,
+    include: Iterable[str] | None = None,
+    exclude: Iterable[str] | None = None
+) -> bool:
+    """
+    Return True if `path` would be yielded by `filter` with the same
+    `include` and `exclude`, regardless of whether it is a file.
+    """
+    if isinstance(path, str):
+        path = Path(path)
+    return _match(path.name, _normalize(include), _normalize(exclude))
+
+
+class _Directory(NamedTuple):
+    path: str
+    relative: str  # relative to the walk root, '' or ending with '/'
+    ignores: tuple[tuple[str, Ignore], ...]  # (where rules apply, rules)
+
+
+class _Walker:
+    """
+    Yield file entries in the same order as `Path.rglob` (or `Path.glob`
+    if not `recursive`) does, relying on the file type cached by
+    `os.scandir` instead of calling `stat` per entry.
+
+    Ignored directories, by name (`prune`) or by ignore rules, are never
+    entered.
+    """
+
+    def __init__(
+        self,
+        recursive: bool,
+        prune: set[str] | None,
+        ignore: Ignore | None,
+        ignore_files: tuple[str, ...]
+    ) -> None:
+        self.recursive = recursive
+        self.prune = prune
+        self.ignore = ignore
+        self.ignore_files = ignore_files
+
+    def root(self, path: str) -> _Directory:
+        ignores = () if not self.ignore else (('', self.ignore),)
+        return _Directory(path, '', ignores)
+
+    @staticmethod
+    def _ignored(directory: _Directory, name: str, is_dir: bool) -> bool:
+        relative = directory.relative + name
+        for base, ignore in reversed(directory.ignores):  # deepest first
+            ignored = ignore.match(relative[len(base):], is_dir)
+            if ignored is not None:
+                return ignored
+        return False
+
+    def split(
+        self,
+        directory: _Directory,
+        entries: list[os.DirEntry]
+    ) -> tuple[list[os.DirEntry], list[_Directory]]:
+        """
+        Return files among `entries` and directories to enter.
+        """
+        if self.ignore_files:
+            ignores = list(directory.ignores)
+            names = {i.name: i for i in entries}
+            for i in self.ignore_files:
+                if i in names and (ignore := read_ignore(names[i].path)):
+                    ignores.append((directory.relative, ignore))
+            directory = directory._replace(ignores=tuple(ignores))
+
+        files: list[os.DirEntry] = []
+        directories: list[_Directory] = []
+        for entry in entries:
+            if entry.is_file():
+                if directory.ignores and self._ignored(
+                    directory,
+                    entry.name,
+                    False
+                ):
+                    continue
+                files.append(entry)
+            elif (
+                self.recursive and
+                entry.is_dir(follow_symlinks=False) and
+                (self.prune is None or entry.name not in self.prune) and
+                not (
+                    directory.ignores and
+                    self._ignored(directory, entry.name, True)
+                )
+            ):
+                directories.append(
+                    directory._replace(
+                        path=entry.path,
+                        relative=directory.relative + entry.name + '/'
+                    )
+                )
+        return files, directories
+
+    def walk(self, path: str) -> Iterator[os.DirEntry]:
+        stack = [self.root(path)]
+        while stack:
+            directory = stack.pop()
+            files, directories = self.split(
+                directory,
+                _scandir(directory.path)
+            )
+            stack.extend(reversed(directories))
+            yield from files
+
+    def walk_concurrently(self, path: str, jobs: int) -> Iterator[os.DirEntry]:
+        """
+        Same as `walk`, but directories are listed by a thread pool ahead
+        of time, which hides metadata latency of network-mounted or
+        cold-cache trees. Only the `jobs * 4` directories to be visited
+        next are listed in advance, so the order is kept and memory is
+        bounded.
+        """
+        jobs = jobs or min(32, (os.cpu_count() or 1) + 4)
+        window = jobs * 4
+        with ThreadPoolExecutor(jobs) as executor:
+            stack: list[
+                tuple[_Directory, Future[list[os.DirEntry]] | None]
+            ] = [(self.root(path), None)]
+            while stack:
+                # the top of the stack is visited first
+                for k in reversed(range(max(len(stack) - window, 0), len(stack))):
+                    directory, future = stack[k]
+                    if future is None:
+                        future = executor.submit(_scandir, directory.path)
+                        stack[k] = (directory, future)
+                directory, future = stack.pop()
+                assert future is not None
+                files, directories = self.split(directory, future.result())
+                stack.extend((i, None) for i in reversed(directories))
+                yield from files
+
+
+def _scandir(path: str) -> list[os.DirEntry]:
+    try:
+        with os.scandir(path) as it:
+            return list(it)
+    except (PermissionError, FileNotFoundError, NotADirectoryError):
+        # unreadable, or removed while walking, as `Path.glob` ignores
+        return []
 
 
 def filter(
     path: Path | str | None = None,
     include: Iterable[str] | None = None,
     exclude: Iterable[str] | None = None,
-    recursive: bool = False
+    recursive: bool = False,
+    prune: Iterable[str] | None = None,
+    jobs: int = 1,
+    ignore: Iterable[str] | None = None,
+    ignore_files: Iterable[str] | None = None,
+    glob: Iterable[str] | None = None,
+    regex: str | re.Pattern | None = None,
+    min_size: int | None = None,
+    max_size: int | None = None,
+    modified_after: float | None = None,
+    modified_before: float | None = None
 ) -> Generator[Path, None, None]:
     """
     Parameters
@@ -24,6 +232,37 @@ def filter(
         Due to the implementation, `exclude` is prior than `include`.
     recursive :
         If True, filter files recursively.
+    prune :
+        Names of directories not to descend into, e.g. '.git' or
+        'node_modules'.
+    jobs :
+        Number of threads listing directories concurrently (only useful
+        if `recursive`). If 0, use as many as
+        `concurrent.futures.ThreadPoolExecutor` does by default.
+        Paths are yielded in the same order regardless, as soon as they
+        are found.
+    ignore :
+        Pass a Iterable of `.gitignore`-style rules, applied relative to
+        working directory. Ignored directories are never entered.
+    ignore_files :
+        Names of ignore files, e.g. '.gitignore' and '.ignore', to be
+        read from every directory visited; their rules apply to that
+        directory and override those from its parents and `ignore`.
+    glob :
+        If not None, only include files matching any of these
+        `.gitignore`-style patterns, e.g. '*.md' or 'docs/**/*.txt'.
+    regex :
+        If not None, only include files whose '/'-separated path relative
+        to working directory contains a match.
+    min_size, max_size :
+        If not None, only include files of at least/at most this size
+        in bytes.
+    modified_after, modified_before :
+        If not None, only include files modified after/before this
+        timestamp (seconds since the epoch).
+
+    Rules above are compiled once per distinct rule set, and all of them
+    except `glob`, `regex` and the size/time predicates are tested while walking.
     """
     if path is None:
         path = Path()
@@ -34,24 +273,49 @@ def filter(
         yield path
         return None
 
-    if include is not None:
-        include = set(f'.{i.lstrip(".")}' for i in include)
-    if exclude is not None:
-        exclude = set(f".{i.lstrip('.')}" for i in exclude)
+    _include = _normalize(include)
+    _exclude = _normalize(exclude)
+    _glob = None if glob is None else compile_ignore(glob)
+    _regex = None if regex is None else re.compile(regex)
+    _stat = not (
+        min_size is None and
+        max_size is None and
+        modified_after is None and
+        modified_before is None
+    )
+
+    walker = _Walker(
+        recursive,
+        None if prune is None else set(prune),
+        None if ignore is None else compile_ignore(ignore),
+        () if ignore_files is None else tuple(ignore_files)
+    )
 
-    paths = path.rglob('*') if recursive else path.glob('*')
+    if jobs == 1 or not recursive:
+        entries = walker.walk(str(path))
+    else:
+        entries = walker.walk_concurrently(str(path), jobs)
 
-    for i in paths:
-        if not i.is_file():
+    root = len(os.path.join(str(path), ''))  # prefix of entry paths
+    for i in entries:
+        if not _match(i.name, _include, _exclude):
             continue
-        suffix = i.suffix
-        suffixes = ''.join(i.suffixes)
-        if exclude is not None:
-            if suffix in exclude or suffixes in exclude:
+        if _glob is not None or _regex is not None:
+            relative = i.path[root:].replace(os.sep, '/')
+            if _glob is not None and not _glob.match(relative):
                 continue
-        if include is not None:
-            if suffix not in include and suffixes not in include:
+            if _regex is not None and not _regex.search(relative):
                 continue
-        yield i
-        
+        if _stat:
+            stat = i.stat()
+            if min_size is not None and stat.st_size < min_size:
+                continue
+            if max_size is not None and stat.st_size > max_size:
+                continue
+            if modified_after is not None and stat.st_mtime <= modified_after:
+                continue
+            if modified_before is not None and stat.st_mtime >= modified_before:
+                continue
+        yield Path(i.path)
+
     return None
@@ -0,0 +1,140 @@
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable
+
+
+def _translate(pattern: str) -> str:
+    """
+    Translate the glob part of a `.gitignore` pattern into a regex to be
+    fully matched against a '/'-separated relative path.
+    """
+    result: list[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**', i) and (i == 0 or pattern[i - 1] == '/'):
+            if pattern.startswith('**/', i):
+                result.append('(?:.*/)?')  # zero or more directories
+                i += 3
+                continue
+            if i + 2 == n:
+                result.append('.*')  # everything inside
+                i += 2
+                continue
+        if c == '*':
+            result.append('[^/]*')
+        elif c == '?':
+            result.append('[^/]')
+        elif c == '[':
+            j = pattern.find(']', i + 2)
+            if j == -1:
+                result.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                result.append(f'[{body}]')
+                i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            result.append(re.escape(pattern[i]))
+        else:
+            result.append(re.escape(c))
+        i += 1
+    return ''.join(result)
+
+
+def _parse(rule: str) -> tuple[str, bool, bool] | None:
+    """
+    Return `(regex, negated, directory_only)`, or None for blank lines
+    and comments.
+    """
+    if not rule.endswith('\\ '):  # an escaped trailing space is kept
+        rule = rule.rstrip()
+    if not rule or rule.startswith('#'):
+        return None
+    negated = rule.startswith('!')
+    if negated:
+        rule = rule[1:]
+    elif rule.startswith(('\\!', '\\#')):
+        rule = rule[1:]
+    directory_only = rule.endswith('/')
+    rule = rule.rstrip('/')
+    if not rule:
+        return None
+    anchored = '/' in rule
+    regex = _translate(rule.lstrip('/'))
+    if not anchored:
+        regex = '(?:.*/)?' + regex
+    return regex, negated, directory_only
+
+
+class Ignore:
+    """
+    Compiled `.gitignore`-style rules.
+
+    Consecutive rules of the same polarity are joined into a single
+    regex, so a path is tested against one regex per run of negated or
+    non-negated rules instead of once per rule; the last matching rule
+    wins, as in git.
+    """
+
+    def __init__(self, rules: Iterable[str]) -> None:
+        runs: list[tuple[bool, list[str], list[str]]] = []
+        for i in rules:
+            parsed = _parse(i)
+            if parsed is None:
+                continue
+            regex, negated, directory_only = parsed
+            if not runs or runs[-1][0] != negated:
+                runs.append((negated, [], []))
+            runs[-1][1].append(regex)
+            if not directory_only:
+                runs[-1][2].append(regex)
+        self.__runs = [
+            (
+                negated,
+                re.compile('|'.join(directories)),
+                re.compile('|'.join(files)) if files else None
+            )
+            for negated, directories, files in reversed(runs)
+        ]
+
+    def __bool__(self) -> bool:
+        return bool(self.__runs)
+
+    def match(self, relative: str, is_dir: bool = False) -> bool | None:
+        """
+        Return True if `relative` ('/'-separated, relative to where the
+        rules apply) is ignored, False if it is explicitly re-included by
+        a negated rule, or None if no rule matches.
+        """
+        for negated, directories, files in self.__runs:
+            pattern = directories if is_dir else files
+            if pattern is not None and pattern.fullmatch(relative):
+                return not negated
+        return None
+
+
+@lru_cache(maxsize=256)
+def _compile(rules: tuple[str, ...]) -> Ignore:
+    return Ignore(rules)
+
+
+def compile_ignore(rules: Iterable[str]) -> Ignore:
+    """
+    Return compiled rules, cached per rule set.
+    """
+    return _compile(tuple(rules))
+
+
+def read_ignore(path: Path | str) -> Ignore:
+    """
+    Return compiled rules of an ignore file, e.g. '.gitignore'.
+    """
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            return compile_ignore(f.read().splitlines())
+    except OSError:
+        return compile_ignore(())
@@ -0,0 +1,185 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Generator
+
+# see inotify(7)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+
+_MASK = (
+    _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE |
+    _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR
+)
+
+_EVENT = struct.Struct('iIII')
+
+
+def _libc() -> ctypes.CDLL | None:
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+
+def _inotify(
+    libc: ctypes.CDLL,
+    path: Path,
+    recursive: bool,
+    latency: float
+) -> Generator[set[Path], None, None]:
+    fd: int = libc.inotify_init1(os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    watches: dict[int, Path] = {}
+
+    def add(directory: Path) -> None:
+        wd = libc.inotify_add_watch(fd, os.fsencode(directory), _MASK)
+        if wd >= 0:  # the directory may be gone already
+            watches[wd] = directory
+        if recursive:
+            try:
+                subdirectories = [
+                    i for i in directory.iterdir()
+                    if i.is_dir() and not i.is_symlink()
+                ]
+            except FileNotFoundError:
+                return None
+            for i in subdirectories:
+                add(i)
+
+    try:
+        add(path)
+        while True:
+            changed: set[Path] = set()
+            timeout: float | None = None  # block until the first event
+            while select.select([fd], [], [], timeout)[0]:
+                buffer = os.read(fd, 0x10000)
+                offset = 0
+                while offset < len(buffer):
+                    wd, mask, _, length = _EVENT.unpack_from(buffer, offset)
+                    offset += _EVENT.size
+                    name = os.fsdecode(
+                        buffer[offset:offset + length].rstrip(b'\0')
+                    )
+                    offset += length
+                    if mask & _IN_Q_OVERFLOW:
+                        changed.add(path)
+                        continue
+                    if mask & _IN_IGNORED:
+                        watches.pop(wd, None)
+                        continue
+                    directory = watches.get(wd)
+                    if directory is None or not name:
+                        continue
+                    target = directory / name
+                    if mask & _IN_ISDIR:
+                        if not recursive:
+                            continue
+                        if mask & (_IN_CREATE | _IN_MOVED_TO):
+                            add(target)
+                    changed.add(target)
+                timeout = latency  # coalesce events of a single save
+            yield changed
+    finally:
+        os.close(fd)
+
+
+def _snapshot(
+    path: Path,
+    recursive: bool
+) -> dict[Path, tuple[int, int, int]]:
+    snapshot: dict[Path, tuple[int, int, int]] = {}
+    for i in path.rglob('*') if recursive else path.glob('*'):
+        try:
+            stat = i.stat()
+        except FileNotFoundError:
+            continue
+        if i.is_file():
+            snapshot[i] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    return snapshot
+
+
+def _poll(
+    path: Path,
+    recursive: bool,
+    interval: float
+) -> Generator[set[Path], None, None]:
+    previous = _snapshot(path, recursive)
+    while True:
+        time.sleep(interval)
+        current = _snapshot(path, recursive)
+        changed = {
+            i
+            for i in previous.keys() | current.keys()
+            if previous.get(i) != current.get(i)
+        }
+        previous = current
+        if changed:
+            yield changed
+
+
+def monitor(
+    path: Path | str | None = None,
+    recursive: bool = False,
+    interval: float = 0.5,
+    latency: float = 0.01
+) -> Generator[set[Path], None, None]:
+    """
+    Yield paths changed under a directory, forever.
+
+    Parameters
+    ----------
+    path :
+        Specify working directory. If None, use current working directory.
+    recursive :
+        If True, monitor subdirectories as well.
+    interval :
+        Polling interval in seconds, used if inotify is not available.
+    latency :
+        Seconds to wait for further inotify events before yielding, so
+        that events of a single save are yielded together.
+
+    Yields
+    ------
+    set[Path] :
+        Created, modified, moved or deleted files. A directory is yielded
+        if it is created, moved or deleted as a whole (inotify only), and
+        `path` itself if events are lost, in which case the subtree should
+        be scanned again.
+    """
+    if path is None:
+        path = Path()
+    elif isinstance(path, str):
+        path = Path(path)
+
+    libc = _libc()
+    if libc is not None:
+        try:
+            yield from _inotify(libc, path, recursive, latency)
+            return None
+        except OSError:
+            pass  # e.g. out of watches
+
+    yield from _poll(path, recursive, interval)
+    return None
@@ -1,67 +1,235 @@
+import argparse
 import os
 import subprocess
 import sys
+import time
 import venv
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Sequence
 
 from models.consts import DOTFILES, HOME, SERVICES
 
 VENV_NAME = 'ink'
 
+STAGES = ('pyyaml', 'chocolatey', 'dotfiles', 'venv')
 
-def main() -> None:
-
-    services = SERVICES.as_posix()
 
+def _ask(question: str) -> bool:
     while True:
-        reply = input('Install PyYAML(dependency)? [y/n]: ').lower()
+        reply = input(f'{question} [y/n]: ').lower()
         if reply.startswith('y'):
-            subprocess.run('pip install PyYAML')
-            from models.dotfile import deploy_dotfile
-            break
+            return True
         elif reply.startswith('n'):
-            try:
-                from models.dotfile import deploy_dotfile
-            except ImportError:
-                print('Missing dependencies.')
-                sys.exit()
-            break
+            return False
         print("Invalid input. Please enter 'y' or 'n'.")
 
-    while os.name == 'nt':
-        reply = input('Install Chocolatey? [y/n]: ').lower()
-        if reply.startswith('y'):
-            subprocess.run(f'powershell {services}/choco-install.ps1')
-            subprocess.run(f'powershell {services}/choco-packages.ps1')
-            break
-        elif reply.startswith('n'):
-            break
-        print("Invalid input. Please enter 'y' or 'n'.")
 
-    while True:
-        reply = input('Deploy dotfiles? [y/n]: ').lower()
-        if reply.startswith('y'):
-            for i in DOTFILES.rglob('*'):
-                if not i.is_file():
-                    continue
-                deploy_dotfile(i, HOME / i.name)
-            break
-        elif reply.startswith('n'):
-            break
-        print("Invalid input. Please enter 'y' or 'n'.")
+class _StageError(Exception):
+    pass
 
-    while True:
-        reply = input('Deploy Python virtual environment? [y/n]: ').lower()
-        if reply.startswith('y'):
-            dir = HOME / f'venv/{VENV_NAME}'
-            if not dir.exists():
-                venv.main([str(dir)])
-            subprocess.run(
-                f'{dir}/Scripts/pip install -r {services}/requirements.txt'
-            )
-            break
-        elif reply.startswith('n'):
-            break
-        print("Invalid input. Please enter 'y' or 'n'.")
+
+def _timed(name: str, func: Callable[[], None]) -> bool:
+    """
+    Run a stage and report its wall time, or its failure.
+
+    Returns
+    -------
+    bool : If the stage succeeded.
+    """
+    start = time.perf_counter()
+    try:
+        func()
+    except subprocess.CalledProcessError as e:
+        print(f"Stage '{name}' failed, exit code {e.returncode}.")
+        return False
+    except (_StageError, OSError) as e:
+        print(f"Stage '{name}' failed, {e}.")
+        return False
+    print(f"Stage '{name}' done in {time.perf_counter() - start:.2f}s.")
+    return True
+
+
+def install_pyyaml() -> None:
+    subprocess.run(
+        [sys.executable, '-m', 'pip', 'install', 'PyYAML'],
+        check=True
+    )
+
+
+def install_chocolatey() -> None:
+    for i in ('choco-install.ps1', 'choco-packages.ps1'):
+        subprocess.run(['powershell', str(SERVICES / i)], check=True)
+
+
+def deploy_dotfiles(jobs: int = 0) -> None:
+    from models.dotfile import DotfileError
+    from models.dotfile import deploy_dotfiles as deploy
+    from models.tag import TagParser
+
+    try:
+        written, unchanged = deploy(
+            (i for i in DOTFILES.rglob('*') if i.is_file()),
+            HOME,
+            jobs
+        )
+    except DotfileError as e:
+        raise _StageError(f'dotfiles not deployed, {e}') from e
+    print(f'Dotfiles: {written} written, {unchanged} unchanged.')
+    if report := TagParser.report():
+        print(report)
+
+
+def deploy_venv() -> None:
+    dir = HOME / f'venv/{VENV_NAME}'
+    if not dir.exists():
+        venv.main([str(dir)])
+    python = dir / ('Scripts' if os.name == 'nt' else 'bin') / 'python'
+    subprocess.run(
+        [
+            str(python), '-m', 'pip', 'install',
+            '-r', str(SERVICES / 'requirements.txt')
+        ],
+        check=True
+    )
+
+
+def run(stages: set[str], jobs: int = 0) -> list[str]:
+    """
+    Run selected stages, each reporting its wall time.
+
+    Installing PyYAML comes first, as rendering dotfiles depends on it,
+    then Chocolatey; dotfiles and the virtual environment are
+    independent of each other, thus deployed concurrently.
+
+    Returns
+    -------
+    list[str] : Names of failed stages.
+    """
+    start = time.perf_counter()
+    failed: list[str] = []
+
+    if 'pyyaml' in stages and not _timed('pyyaml', install_pyyaml):
+        failed.append('pyyaml')
+
+    if 'dotfiles' in stages:
+        try:
+            import models.dotfile  # depends on PyYAML
+        except ImportError:
+            print('Missing dependencies.')
+            sys.exit(1)
+
+    if (
+        'chocolatey' in stages and os.name == 'nt' and
+        not _timed('chocolatey', install_chocolatey)
+    ):
+        failed.append('chocolatey')
+
+    concurrent: list[tuple[str, Callable[[], None]]] = []
+    if 'dotfiles' in stages:
+        concurrent.append(('dotfiles', lambda: deploy_dotfiles(jobs)))
+    if 'venv' in stages:
+        concurrent.append(('venv', deploy_venv))
+    with ThreadPoolExecutor(max(len(concurrent), 1)) as executor:
+        futures = [(i[0], executor.submit(_timed, *i)) for i in concurrent]
+        failed.extend(name for name, future in futures if not future.result())
+
+    if failed:
+        print(f"Failed: {', '.join(failed)}.")
+    else:
+        print(f'Deployed in {time.perf_counter() - start:.2f}s.')
+    return failed
+
+
+def _from_config() -> set[str]:
+    try:
+        from models import config
+    except ImportError:
+        print('Missing dependencies.')
+        sys.exit(1)
+    stages: set[str] = set()
+    for i in STAGES:
+        try:
+            if config.lookup(f'deploy.{i}'):
+                stages.add(i)
+        except KeyError:
+            pass
+    return stages
+
+
+class _Help:
+
+    yes = """
+        run all stages without prompts
+    """
+
+    stage = """
+        run selected stages without prompts (available: 'pyyaml',
+        'chocolatey', 'dotfiles' and 'venv')
+    """
+
+    from_config = """
+        run stages enabled under `deploy` in configuration without
+        prompts
+    """
+
+    jobs = """
+        number of threads deploying dotfiles; if 0, use the default of
+        the thread pool (default: 0)
+    """
+
+
+def main(args: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser('Deploy')
+    parser.add_argument(
+        '-y',
+        '--yes',
+        action='store_true',
+        help=_Help.yes
+    )
+    parser.add_argument(
+        '-s',
+        '--stage',
+        action='extend',
+        nargs='+',
+        choices=STAGES,
+        help=_Help.stage
+    )
+    parser.add_argument(
+        '-c',
+        '--from-config',
+        action='store_true',
+        help=_Help.from_config
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=0,
+        help=_Help.jobs,
+        metavar=''
+    )
+
+    options = parser.parse_args(args)
+
+    if options.yes:
+        stages = set(STAGES)
+    elif options.stage is not None:
+        stages = set(options.stage)
+    elif options.from_config:
+        stages = _from_config()
+    else:
+        stages = set()
+        if _ask('Install PyYAML(dependency)?'):
+            stages.add('pyyaml')
+        if os.name == 'nt' and _ask('Install Chocolatey?'):
+            stages.add('chocolatey')
+        if _ask('Deploy dotfiles?'):
+            stages.add('dotfiles')
+        if _ask('Deploy Python virtual environment?'):
+            stages.add('venv')
+
+    if run(stages, options.jobs):
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -1,25 +1,100 @@
+import base64
+import datetime
+import json
+import os
+import threading
 from collections import UserDict
 from pathlib import Path
-from typing import Self
+from typing import Any, Self
 
 import yaml
 
-from .consts import CONFIG_GLOBAL, CONFIG_USER
+from .consts import CONFIG_GLOBAL, CONFIG_SNAPSHOT, CONFIG_USER
+
+_Loader: type[yaml.SafeLoader] | type[yaml.CSafeLoader]
+if yaml.__with_libyaml__:
+    _Loader = yaml.CSafeLoader
+else:  # PyYAML built without libyaml
+    _Loader = yaml.SafeLoader
+
+
+def _parse(path: Path) -> Any:
+    with open(path, encoding='utf-8') as f:
+        return yaml.load(f, Loader=_Loader)
+
+
+def _encode(value: Any) -> Any:
+    """
+    Convert what YAML may load into JSON, tagging values JSON can not
+    hold (dates, binary, sets, dicts with non-str keys) as one-key
+    objects, e.g. `{"$date": "1998-09-30"}`.
+    """
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value) and not (
+            len(value) == 1 and next(iter(value)).startswith('$')
+        ):
+            return {k: _encode(v) for k, v in value.items()}
+        return {'$dict': [[_encode(k), _encode(v)] for k, v in value.items()]}
+    if isinstance(value, list):
+        return [_encode(i) for i in value]
+    if isinstance(value, datetime.datetime):  # before its base class date
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, bytes):
+        return {'$bytes': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, (set, frozenset)):
+        return {'$set': [_encode(i) for i in value]}
+    return value
+
+
+def _decode(obj: dict[str, Any]) -> Any:
+    if len(obj) != 1:
+        return obj
+    (tag, value), = obj.items()
+    match tag:
+        case '$dict':
+            return {k: v for k, v in value}
+        case '$datetime':
+            return datetime.datetime.fromisoformat(value)
+        case '$date':
+            return datetime.date.fromisoformat(value)
+        case '$bytes':
+            return base64.b64decode(value)
+        case '$set':
+            return set(value)
+    return obj
 
 
 class Config(UserDict):
     """
     YAML files should be modified manually to keep them reader-friendly.
+
+    The merged configuration is saved to `snapshot` as JSON along with
+    mtimes of both files, so that it is not parsed again until either
+    changes, even across processes. Set `snapshot` to None to disable it.
     """
     __instance: 'Config | None' = None
 
+    snapshot: Path | None = CONFIG_SNAPSHOT
+
+    __lock = threading.Lock()  # tags may be rendered by several threads
+
     def __new__(cls, *args, **kwargs) -> 'Config':
         if cls.__instance is None:
             cls.__instance = super().__new__(cls)
         return cls.__instance
 
+    __stamp: tuple | None
+    __index: dict[str, Any]
+
     def __init__(self, path: Path | str | None = None) -> None:
-        self.data = {}
+        # the singleton is initialized again on every `Config()`,
+        # keep what is loaded already
+        if not hasattr(self, 'data'):
+            self.data = {}
+            self.__stamp = None
+            self.__index = {}
         self._set_path(path)
 
     def _get_path(self) -> Path:
@@ -35,14 +110,149 @@ class Config(UserDict):
 
     path = property(fget=_get_path, fset=_set_path)
 
+    @property
+    def stamp(self) -> tuple | None:
+        """
+        Identify the loaded version of both files, None if not loaded.
+        """
+        return self.__stamp
+
+    def _stamp(self) -> tuple:
+        """
+        Identify the current version of both files.
+        """
+        stamp = []
+        for i in (CONFIG_GLOBAL, self.__path):
+            stat = i.stat()
+            stamp.append((str(i), stat.st_mtime_ns, stat.st_size))
+        return tuple(stamp)
+
     def load(self) -> Self:
+        """
+        Load both files, unless neither has changed since last load.
+        """
+        stamp = self._stamp()
+        if stamp == self.__stamp:
+            return self
+        with self.__lock:
+            if stamp == self.__stamp:  # loaded by another thread
+                return self
+            return self._load(stamp)
+
+    def reload(self) -> Self:
+        """
+        Load both files anyway.
+        """
+        with self.__lock:
+            return self._load(self._stamp())
+
+    def _load(self, stamp: tuple) -> Self:
         self.data.clear()
-        with open(CONFIG_GLOBAL, encoding='utf-8') as g:
-            self.data.update(yaml.safe_load(g))
-        with open(self.__path, encoding='utf-8') as u:
-            self.data.update(yaml.safe_load(u))
+        data = self._read_snapshot(stamp)
+        if data is None:
+            data = _parse(CONFIG_GLOBAL)
+            data.update(_parse(self.__path))
+            self._write_snapshot(stamp, data)
+        self.data.update(data)
+        self.__index = _flatten(self.data)
+        self.__stamp = stamp
         return self
 
+    def _read_snapshot(self, stamp: tuple) -> dict | None:
+        if self.snapshot is None:
+            return None
+        try:
+            with open(self.snapshot, encoding='utf-8') as f:
+                snapshot = json.load(f, object_hook=_decode)
+            if snapshot['stamp'] != json.loads(json.dumps(stamp)):
+                return None
+            data = snapshot['data']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None  # missing, corrupt or from another version
+        return data if isinstance(data, dict) else None
+
+    def _write_snapshot(self, stamp: tuple, data: dict) -> None:
+        if self.snapshot is None:
+            return None
+        temp = self.snapshot.with_name(self.snapshot.name + '.tmp')
+        try:
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump({'stamp': stamp, 'data': _encode(data)}, f)
+            os.replace(temp, self.snapshot)
+        except (OSError, TypeError, ValueError):
+            # e.g. read-only checkout, parse again next time
+            temp.unlink(missing_ok=True)
+
+    def lookup(self, key: str) -> Any:
+        """
+        Return the value at a dotted key path, e.g. 'user.name', where
+        list items are addressed by index, e.g. 'a.0' or 'a.-1'.
+
+        Raises
+        ------
+        KeyError :
+            If there is no such key path.
+        """
+        try:
+            return self.__index[key]
+        except KeyError:
+            if '-' not in key:
+                raise
+        # negative list indices are not indexed, resolve them one by one
+        value: Any = self.data
+        prefix = ''
+        for i in key.split('.'):
+            if isinstance(value, list) and i.startswith('-'):
+                try:
+                    n = int(i)
+                except ValueError:
+                    raise KeyError(key) from None
+                if -len(value) <= n:
+                    i = str(n + len(value))
+            prefix += i
+            try:
+                value = self.__index[prefix]
+            except KeyError:
+                raise KeyError(key) from None
+            prefix += '.'
+        return value
+
+
+def _flatten(data: Any) -> dict[str, Any]:
+    """
+    Map every dotted key path in `data` to its value. Of a str key and an
+    int key of the same text, the str key is kept, as looking up a key
+    used to try it first.
+    """
+    index: dict[str, Any] = {}
+    stack: list[tuple[str, Any]] = [('', data)]
+    while stack:
+        prefix, value = stack.pop()
+        if isinstance(value, dict):
+            items = [(k, v) for k, v in value.items() if isinstance(k, str)]
+            items.extend(
+                (str(k), v) for k, v in value.items()
+                if isinstance(k, int) and not isinstance(k, bool)
+                and str(k) not in value
+            )
+        elif isinstance(value, list):
+            items = [(str(k), v) for k, v in enumerate(value)]
+        else:
+            continue
+        for k, v in items:
+            key = prefix + k
+            index[key] = v
+            stack.append((key + '.', v))
+    return index
+
 
 def load(path: Path | str | None = None) -> Config:
     return Config(path).load()
+
+
+def reload(path: Path | str | None = None) -> Config:
+    return Config(path).reload()
+
+
+def lookup(key: str, path: Path | str | None = None) -> Any:
+    return Config(path).load().lookup(key)
@@ -27,6 +27,7 @@ DOTFILES = ROOT / 'dotfiles'
 
 CONFIG_GLOBAL = SERVICES / 'data/default.yml'
 CONFIG_USER = ROOT / 'config.yml'
+CONFIG_SNAPSHOT = ROOT / '.config.snapshot'
 
 if ROOT.drive:
     ROOT_STR = '/' + ''.join(ROOT.as_posix().split(':', 1))
@@ -1,8 +1,35 @@
+import hashlib
+import io
+import os
 import re
 import shlex
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterable
 
-from .tag import tagparse_s
+from . import config
+from .tag import TagParser, tagparse_s
+
+
+class DotfileError(Exception):
+    pass
+
+
+class Template:
+    """
+    A compiled dotfile: literal segments and tag slots (tuple of tag
+    tokens) in order, so that rendering only evaluates tags.
+    """
+
+    def __init__(self, parts: list[str | tuple[str, ...]]) -> None:
+        self.parts = parts
+
+    def render(self) -> str:
+        return ''.join(
+            i if isinstance(i, str) else shlex.quote(tagparse_s(list(i)))
+            for i in self.parts
+        )
 
 
 class DotfileDeployer:
@@ -11,8 +38,10 @@ class DotfileDeployer:
     to: Path
     delimiter = ('{%', '%}')
 
-    __line: list[str]
+    __line: list[str | tuple[str, ...]]
     __tag_tokens: list[str]
+    # keyed by digest of source and delimiter
+    __templates: dict[tuple[bytes, tuple[str, str]], Template] = {}
     __line_pattern = re.compile(r'^(?P<lwhitespaces>\s*)(?P<body>.*)\n$')
     __stop_parsing = re.compile(r'^\s*#\s*stop\s*$', re.IGNORECASE)
     __whitespace = re.compile(r'\s')
@@ -31,7 +60,7 @@ class DotfileDeployer:
         self.__line = []
         self.__tag_tokens = []
 
-    def _line_inject(self, line: str) -> str:
+    def _line_compile(self, line: str) -> list[str | tuple[str, ...]]:
         match = self.__line_pattern.fullmatch(line)
         assert match is not None
         self.__tag_tokens.clear()
@@ -56,32 +85,150 @@ class DotfileDeployer:
             if (not token.startswith(rd)) or self.__whitespace.search(token):
                 self.__tag_tokens.append(token)
                 continue
-            self.__line.append(shlex.quote(tagparse_s(self.__tag_tokens)))
+            self.__line.append(tuple(self.__tag_tokens))
             self.__tag_tokens.clear()
             if token := token.lstrip(rd):
                 self.__line.append(token + ' ')
             active = False
-        return ''.join(self.__line).rstrip() + '\n'
+        # join adjacent literals, and strip the line as a whole
+        # (a rendered slot never ends with whitespace)
+        parts: list[str | tuple[str, ...]] = []
+        for i in self.__line:
+            if isinstance(i, str) and parts and isinstance(parts[-1], str):
+                parts[-1] += i
+            else:
+                parts.append(i)
+        if isinstance(parts[-1], str):
+            parts[-1] = parts[-1].rstrip()
+        parts.append('\n')
+        return parts
 
-    def deploy(self) -> None:
-        if self.to.exists():
-            prev = Path(f'{self.to}.prev')
-            if prev.exists():
-                prev.unlink()
-            self.to.rename(prev)
-        with (
-            open(self.source, encoding='utf-8') as src,
-            open(self.to, 'w', encoding='utf-8') as to
-        ):
+    def _line_inject(self, line: str) -> str:
+        return Template(self._line_compile(line)).render()
+
+    def _compile(self, source: bytes) -> Template:
+        parts: list[str | tuple[str, ...]] = []
+        with io.TextIOWrapper(io.BytesIO(source), encoding='utf-8') as src:
             for line in src:
                 if self.__stop_parsing.fullmatch(line):
                     break
                 if line.lstrip().startswith('#'):
                     continue
-                to.write(self._line_inject(line))
-            for line in src:
-                to.write(line)
+                parts.extend(self._line_compile(line))
+            parts.append(src.read())
+        # join adjacent literals across lines
+        joined: list[str | tuple[str, ...]] = []
+        for i in parts:
+            if isinstance(i, str) and joined and isinstance(joined[-1], str):
+                joined[-1] += i
+            else:
+                joined.append(i)
+        return Template(joined)
+
+    def compile(self) -> Template:
+        """
+        Return the compiled source, cached by its digest, so that a
+        source is parsed only once however many times it is deployed.
+        """
+        source = self.source.read_bytes()
+        key = (hashlib.sha256(source).digest(), self.delimiter)
+        template = self.__templates.get(key)
+        if template is None:
+            template = self.__templates[key] = self._compile(source)
+        return template
+
+    def deploy(self) -> bool:
+        """
+        Render the source and replace the target atomically, keeping the
+        previous one as `.prev`, unless the target is identical already.
+
+        Returns
+        -------
+        bool : True if written, False if unchanged.
+        """
+        content = self.compile().render()
+        if os.linesep != '\n':  # as written in text mode
+            content = content.replace('\n', os.linesep)
+        rendered = content.encode('utf-8')
+
+        if self.to.exists():
+            if self.to.stat().st_size == len(rendered):
+                with open(self.to, 'rb') as f:
+                    current = hashlib.file_digest(f, 'sha256').digest()
+                if current == hashlib.sha256(rendered).digest():
+                    return False
+            prev = Path(f'{self.to}.prev')
+            if prev.exists():
+                prev.unlink()
+            try:
+                os.link(self.to, prev)
+            except OSError:  # e.g. not supported by the filesystem
+                shutil.copy2(self.to, prev)
+
+        temp = Path(f'{self.to}.tmp')
+        with open(temp, 'wb') as to:
+            to.write(rendered)
+        os.replace(temp, self.to)
+        return True
+
+
+def deploy_dotfile(source: Path | str, to: Path | str) -> bool:
+    return DotfileDeployer(source, to).deploy()
+
+
+def deploy_dotfiles(
+    sources: Iterable[Path | str],
+    to: Path | str,
+    jobs: int = 0
+) -> tuple[int, int]:
+    """
+    Deploy dotfiles into directory `to` under their own names, rendered
+    and written by a thread pool sharing loaded config and compiled
+    templates.
+
+    Parameters
+    ----------
+    sources :
+        Dotfiles to be deployed.
+    to :
+        Destination directory.
+    jobs :
+        Number of threads. If 0, use as many as
+        `concurrent.futures.ThreadPoolExecutor` does by default.
+
+    Returns
+    -------
+    tuple[int, int] : Numbers of files written and unchanged. Tag usage of
+    the run is left in `TagParser.stats`.
+
+    Raises
+    ------
+    DotfileError :
+        If several sources share a name, before anything is deployed.
+    """
+    to = to if isinstance(to, Path) else Path(to)
+
+    by_name: dict[str, list[Path]] = {}
+    for i in sources:
+        i = i if isinstance(i, Path) else Path(i)
+        by_name.setdefault(i.name, []).append(i)
+    collisions = [i for i in by_name.values() if len(i) > 1]
+    if collisions:
+        raise DotfileError(
+            'destination collision: ' + '; '.join(
+                ', '.join(f"'{j}'" for j in i) for i in collisions
+            )
+        )
 
+    config.load()  # once for all workers
+    TagParser.reset()  # pure tags are evaluated once per run
 
-def deploy_dotfile( source: Path | str, to: Path | str):
-    DotfileDeployer(source, to).deploy()
+    with ThreadPoolExecutor(jobs or None) as executor:
+        results = list(
+            executor.map(
+                lambda i: deploy_dotfile(i[0], to / i[1]),
+                ((i[0], name) for name, i in by_name.items())
+            )
+        )
+    written = sum(results)
+    return written, len(results) - written
@@ -1,5 +1,7 @@
+import threading
+import time
 from pathlib import Path
-from typing import Any, Callable
+from typing import Any, Callable, overload
 
 from . import config
 from .consts import ROOT_STR
@@ -9,24 +11,127 @@ class TagError(Exception):
     pass
 
 
+class TagStats:
+    """
+    Usage of a tag: occurrences, actual evaluations (memoized results of
+    pure tags are reused) and total seconds spent evaluating.
+    """
+
+    __slots__ = ('calls', 'evaluations', 'seconds')
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.evaluations = 0
+        self.seconds = 0.0
+
+
 class TagParser:
 
     registry: dict[str, Callable[..., Any]] = {}
+    pure: set[str] = set()
+    stats: dict[str, TagStats] = {}
+
+    __memo: dict[tuple[str, tuple[str, ...]], Any] = {}
+    __stamp: tuple | None = None  # config the memo is valid for
+    __lock = threading.Lock()
 
     def __init__(self, tokens: list[str]) -> None:
         self.tag = tokens.pop(0)
         self.args = tokens
 
+    @overload
+    @classmethod
+    def register(cls, func: Callable[..., Any]) -> Callable[..., Any]: ...
+
+    @overload
+    @classmethod
+    def register(
+        cls,
+        *,
+        pure: bool = False
+    ) -> Callable[[Callable[..., Any]], Callable[..., Any]]: ...
+
+    @classmethod
+    def register(
+        cls,
+        func: Callable[..., Any] | None = None,
+        *,
+        pure: bool = False
+    ) -> Any:
+        """
+        Register a tag, named after the function. A pure tag, whose
+        result only depends on its arguments and config, is evaluated
+        once per run (see `reset`) for the same arguments, as long as
+        config is unchanged.
+        """
+        def register(func: Callable[..., Any]) -> Callable[..., Any]:
+            name = func.__name__.lstrip('_').lower()
+            cls.registry[name] = func
+            if pure:
+                cls.pure.add(name)
+            else:
+                cls.pure.discard(name)
+            return func
+
+        if func is None:
+            return register
+        return register(func)
+
+    @classmethod
+    def reset(cls) -> None:
+        """
+        Start a new run: forget memoized results and stats.
+        """
+        with cls.__lock:
+            cls.__memo.clear()
+            cls.stats.clear()
+
     @classmethod
-    def register(cls, func: Callable[..., Any]) -> Callable[..., Any]:
-        cls.registry[func.__name__.lstrip('_').lower()] = func
-        return func
+    def report(cls) -> str:
+        """
+        Return stats of tags used in this run, slowest first.
+        """
+        lines = [
+            f'{name}: {i.calls} calls, {i.evaluations} evaluated, '
+            f'{i.seconds * 1000:.3f} ms'
+            for name, i in sorted(
+                cls.stats.items(),
+                key=lambda i: i[1].seconds,
+                reverse=True
+            )
+        ]
+        return '\n'.join(lines)
 
     def parse(self) -> Any:
         func = self.registry.get(self.tag)
-        if func is not None:
-            return func(*self.args)
-        raise TagError(f"tag '{self.tag}' not supported")
+        if func is None:
+            raise TagError(f"tag '{self.tag}' not supported")
+
+        pure = self.tag in self.pure
+        key = (self.tag, tuple(self.args))
+        if pure:
+            stamp = config.load().stamp  # no-op unless files changed
+            with self.__lock:
+                if stamp != TagParser.__stamp:
+                    self.__memo.clear()
+                    TagParser.__stamp = stamp
+        if pure and key in self.__memo:
+            with self.__lock:
+                self.stats.setdefault(self.tag, TagStats()).calls += 1
+            return self.__memo[key]
+
+        start = time.perf_counter()
+        value = func(*self.args)
+        seconds = time.perf_counter() - start
+
+        with self.__lock:
+            stats = self.stats.setdefault(self.tag, TagStats())
+            stats.calls += 1
+            stats.evaluations += 1
+            stats.seconds += seconds
+            if pure:
+                self.__memo[key] = value
+        return value
 
 
 def tagparse(tokens: list[str]) -> Any:
@@ -37,29 +142,17 @@ def tagparse_s(tokens: list[str]) -> str:
     return str(tagparse(tokens))
 
 
-@TagParser.register
+@TagParser.register(pure=True)
 def _config(key: str, *_) -> Any:
     """
     A key with `.` is considered invalid due to the implementation.
     """
-    value: Any = config.load()
     try:
-        for i in key.split('.'):
-            # AssertionError if `value` is a str
-            # (str is a Container as well)
-            assert not isinstance(value, str)
-            try:
-                value = value[i]
-            except:
-                # IndexError if `int(i)` out of range
-                # KeyError if `int(i)` is not in `value`
-                # ValueError if `i` is invalid literal for `int()`
-                value = value[int(i)]
-    except (AssertionError, IndexError, KeyError, ValueError):
+        return config.lookup(key)
+    except KeyError:
         raise TagError('key invalid')
-    return value
 
 
-@TagParser.register
+@TagParser.register(pure=True)
 def _root(*_) -> str:
     return ROOT_STR